@@ -1,52 +1,231 @@
+import asyncio
+import csv
+import functools
+import hashlib
+import io
+import json
 import os
 import secrets
+import time
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 from tempfile import mkdtemp
 
+import click
 from dotenv import load_dotenv
-from flask import Flask, redirect, render_template, request, session, send_from_directory
+from flask import (
+    Flask, Response, flash, g, has_app_context, jsonify, make_response, redirect, render_template, request,
+    session, send_from_directory, stream_with_context, url_for
+)
 from flask_migrate import Migrate
+from flask.cli import AppGroup
 from flask_session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from werkzeug.exceptions import default_exceptions, HTTPException, InternalServerError
 from werkzeug.security import check_password_hash, generate_password_hash
 
-from helpers import apology, login_required, lookup, usd
-from models import PortfolioPosition, TradeHistory, User, db
+from helpers import (
+    SYMBOL_INDEX_FILE, PortfolioValuation, api_error, api_login_required, apology, fetch_quotes,
+    fetch_quotes_async, known_symbol, login_required, lookup, lookup_company_names, lookup_quotes,
+    lookup_quotes_async, normalize_symbol, quote_breaker, quote_cache, quotes_unavailable, symbol_index,
+    unresolved_symbols, usd, valid_symbol
+)
+from instrumentation import init_instrumentation, register_gauges
+from models import Order, PortfolioPosition, StoredQuote, SymbolMetadata, TradeHistory, User, db
+from prices import PriceStore, chart_points, portfolio_value_series, trades_frame
+from symbols import SymbolIndex, download_listings
 
 load_dotenv()
 
+
+# Engine and pool settings from the environment, the pool is per worker process
+def engine_options(database_uri):
+    url = make_url(database_uri)
+    options = {
+        # Compiled SQL kept per engine, so repeated statements skip compilation
+        "query_cache_size": int(os.getenv("DB_QUERY_CACHE_SIZE", "500")),
+        # Off by default, connections that died while idle are handled when they fail
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "0") == "1",
+    }
+    # In-memory SQLite uses a single shared connection, there is no pool to size
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        options.update({
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            # Recycle before server or proxy idle timeouts close connections
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        })
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg2":
+        # Send executemany() parameter sets in pages instead of one round trip each
+        options["executemany_mode"] = os.getenv("DB_EXECUTEMANY_MODE", "values_plus_batch")
+        options["executemany_batch_page_size"] = int(os.getenv("DB_EXECUTEMANY_PAGE_SIZE", "100"))
+    return options
+
+
 # Configure application
 app = Flask(__name__, static_folder="static")
 
 # Ensure templates are auto-reloaded
 app.config["TEMPLATES_AUTO_RELOAD"] = True
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///finance.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_pre_ping": True}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["SECRET_KEY"] = os.getenv("SESSION_SECRET", secrets.token_hex(32))
+# Company names rarely change, keep them for a long time
+app.config["SYMBOL_NAME_TTL"] = timedelta(days=int(os.getenv("SYMBOL_NAME_TTL_DAYS", "30")))
+# Quotes written by `flask quotes refresh` are trusted for this long
+app.config["QUOTE_STORE_MAX_AGE"] = timedelta(seconds=int(os.getenv("QUOTE_STORE_MAX_AGE", "120")))
+app.config["QUOTE_REFRESH_INTERVAL"] = int(os.getenv("QUOTE_REFRESH_INTERVAL", "30"))
+app.config["QUOTE_REFRESH_BATCH"] = int(os.getenv("QUOTE_REFRESH_BATCH", "50"))
+app.config["HISTORY_PAGE_SIZE"] = 50
+app.config["HISTORY_MAX_PAGE_SIZE"] = 200
+app.config["HISTORY_EXPORT_CHUNK"] = 1000
+# Upper bounds on a single batched API call
+app.config["API_MAX_SYMBOLS"] = 50
+app.config["API_MAX_ORDERS"] = 50
+# Queue /buy and /sell orders for `flask orders settle` instead of trading in the request
+app.config["ORDER_QUEUE"] = os.getenv("ORDER_QUEUE", "0") == "1"
+app.config["ORDER_SETTLE_INTERVAL"] = float(os.getenv("ORDER_SETTLE_INTERVAL", "1"))
+app.config["ORDER_SETTLE_BATCH"] = int(os.getenv("ORDER_SETTLE_BATCH", "500"))
+# Orders left settling longer than this by a crashed worker are claimed again
+app.config["ORDER_CLAIM_TIMEOUT"] = timedelta(seconds=int(os.getenv("ORDER_CLAIM_TIMEOUT", "300")))
+app.config["ORDERS_PAGE_SIZE"] = 50
 
-# Configure session to use filesystem (instead of signed cookies)
-session_dir = os.path.join(app.instance_path, "flask_session")
-os.makedirs(session_dir, exist_ok=True)
-app.config["SESSION_FILE_DIR"] = session_dir
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
 
 db.init_app(app)
 migrate = Migrate(app, db)
 
-# Ensure responses aren't cached
+
+# Without pre-ping a dead connection fails its statement, SQLAlchemy then drops every
+# pooled connection opened before it so the next checkouts reconnect
+def on_engine_error(context):
+    if context.is_disconnect:
+        print("Database connection lost, reconnecting pooled connections:", context.original_exception)
+
+# Log the effective engine settings and check the pool covers every request thread
+def check_engine_settings():
+    options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+    engine = db.engine
+    threads = int(os.getenv("GUNICORN_THREADS", "1"))
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    settings = [
+        f"{engine.dialect.name}+{engine.dialect.driver}",
+        type(engine.pool).__name__,
+        f"pre_ping={'on' if options['pool_pre_ping'] else 'off'}",
+        f"query_cache_size={options['query_cache_size']}",
+    ]
+    if "pool_size" in options:
+        connections = options["pool_size"] + options["max_overflow"]
+        settings += [
+            f"pool_size={options['pool_size']}",
+            f"max_overflow={options['max_overflow']}",
+            f"pool_recycle={options['pool_recycle']}s",
+            f"up to {connections * workers} connections across {workers} workers",
+        ]
+        if connections < threads:
+            print(f"DB_POOL_SIZE + DB_MAX_OVERFLOW ({connections}) is below GUNICORN_THREADS ({threads}),"
+                  " requests will queue for connections")
+    if "executemany_mode" in options:
+        settings.append(
+            f"executemany={options['executemany_mode']}/{options['executemany_batch_page_size']}"
+        )
+    print("Database engine:", ", ".join(settings))
+
+with app.app_context():
+    event.listen(db.engine, "handle_error", on_engine_error)
+    check_engine_settings()
+
+# Configure sessions, signed cookies unless a server side store is asked for
+app.config["SESSION_PERMANENT"] = False
+session_backend = os.getenv("SESSION_BACKEND", "cookie")
+if session_backend == "cookie":
+    # A per-process random key would log everyone out on restart and split workers
+    if not os.getenv("SESSION_SECRET"):
+        raise ValueError("SESSION_SECRET must be set for the cookie session backend")
+elif session_backend == "sqlalchemy":
+    app.config["SESSION_TYPE"] = "sqlalchemy"
+    app.config["SESSION_SQLALCHEMY"] = db
+    # Sweep expired sessions on average once every N requests
+    app.config["SESSION_CLEANUP_N_REQUESTS"] = int(os.getenv("SESSION_CLEANUP_N_REQUESTS", "1000"))
+    Session(app)
+elif session_backend == "redis":
+    # Optional dependency, only needed for this backend
+    import redis
+
+    app.config["SESSION_TYPE"] = "redis"
+    app.config["SESSION_REDIS"] = redis.from_url(os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"))
+    Session(app)
+elif session_backend == "filesystem":
+    session_dir = os.path.join(app.instance_path, "flask_session")
+    os.makedirs(session_dir, exist_ok=True)
+    app.config["SESSION_FILE_DIR"] = session_dir
+    app.config["SESSION_TYPE"] = "filesystem"
+    Session(app)
+else:
+    raise ValueError(f"Unknown session backend: {session_backend}")
+
+# Local daily price history shared by every user holding the same symbols
+price_store = PriceStore(
+    os.getenv("PRICE_STORE_DIR", os.path.join(app.instance_path, "prices")),
+    start=date.fromisoformat(os.getenv("PRICE_STORE_START", "2015-01-01")),
+    retry_after=float(os.getenv("PRICE_STORE_RETRY", "900")),
+)
+
+# Server-Timing header, request log line and optional /metrics for every request
+init_instrumentation(
+    app,
+    log_requests=os.getenv("REQUEST_LOG", "1") == "1",
+    metrics_enabled=os.getenv("METRICS_ENABLED", "0") == "1",
+)
+register_gauges(lambda: {
+    "finance_quote_cache_" + name: value for name, value in quote_cache.stats().items()
+})
+register_gauges(lambda: {
+    **{"finance_quote_breaker_" + name: value for name, value in quote_breaker.stats().items()},
+    **{"finance_quote_unresolved_" + name: value for name, value in unresolved_symbols.stats().items()},
+})
+
+# Read-only pages served with an ETag that clients revalidate
+REVALIDATED_ENDPOINTS = {"history"}
+
+# Ensure responses aren't cached, apart from static files and revalidated pages
 @app.after_request
 def after_request(response):
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
+    if request.endpoint == "static":
+        if request.args.get("v"):
+            # Content hashed URL, the file behind it never changes
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "public, max-age=3600"
+    elif request.endpoint == "robots":
+        response.headers["Cache-Control"] = "public, max-age=86400"
+    elif request.endpoint in REVALIDATED_ENDPOINTS:
+        response.headers["Cache-Control"] = "private, no-cache"
+    else:
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        response.headers["Expires"] = 0
+        response.headers["Pragma"] = "no-cache"
     return response
 
 # Custom filter
 app.jinja_env.filters["usd"] = usd
 
+# Hash of a static file, recomputed only when it changes on disk
+@functools.lru_cache(maxsize=256)
+def static_file_hash(path, mtime):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()[:12]
+
+# Static URL with a content hash so browsers can cache it for good
+@app.template_global()
+def static_url(filename):
+    path = os.path.join(app.static_folder, filename)
+    return url_for("static", filename=filename, v=static_file_hash(path, os.path.getmtime(path)))
+
 @app.route("/robots.txt")
 def robots():
     return send_from_directory(app.static_folder, "robots.txt", mimetype="text/plain")
@@ -55,13 +234,9 @@ def robots():
 @login_required
 def index():
     """Show portfolio of stocks"""
-    cash_balance = get_user_balance()
-
-    stocks = get_portfolio_with_price(True)
-    total = total_value(cash_balance)
-    msg = session["msg"]
-    session["msg"] = ''
-    return render_template("index.html", stocks=stocks, balance=usd(cash_balance), total=usd(total), message=msg)
+    user = get_user()
+    portfolio = get_portfolio_valuation(user.cash if user else None)
+    return render_template("index.html", portfolio=portfolio)
 
 
 @app.route("/buy", methods=["GET", "POST"])
@@ -72,15 +247,24 @@ def buy():
         amount = int(request.form.get("shares"))
         if amount < 1:
             return apology('Amount should be higher than 0')
+        elif app.config["ORDER_QUEUE"]:
+            # Priced and filled later by the settlement worker
+            queue_msg = queue_order(request.form.get("symbol"), amount, 'buy')
+            if queue_msg:
+                return apology(queue_msg)
+            flash("Order queued")
+            return redirect("/orders")
         else:
             # Make call to buy
             msg = buy_stock(request.form.get("symbol"), amount)
             if msg == 'Insufficient funds' :
                 return apology('Insufficient funds')
             elif msg:
-                session["msg"] = msg
+                flash(msg)
                 return redirect("/")
                 # return render_template("index.html", message=msg)
+            elif quotes_unavailable():
+                return apology("Quotes are unavailable, try again shortly", 503)
             else:
                 return apology("Unknown Symbol")
 
@@ -101,9 +285,65 @@ def history():
     if request.method == "POST":
         return apology("TODO")
     else:
-        transactions = get_user_history()
-        result=list(reversed(transactions))
-        return render_template("history.html", transactions=result)
+        page_size = request.args.get("size", app.config["HISTORY_PAGE_SIZE"], type=int)
+        page_size = min(max(page_size, 1), app.config["HISTORY_MAX_PAGE_SIZE"])
+        cursor = request.args.get("before", type=int)
+
+        # Unchanged until the user trades again, answer revalidations without rendering
+        etag = get_history_etag(cursor, page_size)
+        if etag and etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        transactions, next_cursor = get_user_history(cursor, page_size)
+        response = make_response(render_template(
+            "history.html", transactions=transactions, next_cursor=next_cursor,
+            page_size=page_size, paged=cursor is not None
+        ))
+        if etag:
+            response.set_etag(etag)
+        return response
+
+@app.route("/history/export")
+@login_required
+def history_export():
+    """Download full history of transactions as CSV or NDJSON"""
+    export_format = request.args.get("format", "csv")
+    if export_format not in HISTORY_EXPORT_MIMETYPES:
+        return apology("Unknown export format")
+
+    rows = stream_user_history(session["user_id"])
+    if export_format == "csv":
+        body = history_csv_chunks(rows)
+    else:
+        body = history_ndjson_chunks(rows)
+    return Response(
+        stream_with_context(body),
+        mimetype=HISTORY_EXPORT_MIMETYPES[export_format],
+        headers={"Content-Disposition": f"attachment; filename=history.{export_format}"},
+    )
+
+@app.route("/value")
+@login_required
+def value():
+    """Show portfolio value over time"""
+    series = get_portfolio_value_history(session["user_id"])
+    if series is None or len(series) < 2:
+        return render_template("value.html")
+    return render_template("value.html", series=series, points=chart_points(series.values))
+
+@app.route("/value/data")
+@login_required
+def value_data():
+    """Portfolio value over time as JSON"""
+    series = get_portfolio_value_history(session["user_id"])
+    if series is None:
+        return jsonify([])
+    return jsonify([
+        {"date": day.strftime("%Y-%m-%d"), "value": round(float(total), 2)}
+        for day, total in series.items()
+    ])
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -133,7 +373,6 @@ def login():
 
         # Remember which user has logged in
         session["user_id"] = user.id
-        session["msg"] = ''
         print("User session set with user id:", session["user_id"])
 
         # Redirect user to home page
@@ -163,8 +402,11 @@ def quote():
     if request.method == "POST":
         stock_value = lookup(request.form.get("symbol"))
         if stock_value:
-            msg = 'A share of ' + stock_value['name'] + ' (' + stock_value['symbol'] + ') costs $' + str(stock_value['price'])
+            name = get_symbol_names([stock_value['symbol']]).get(stock_value['symbol'], 'Not Found')
+            msg = 'A share of ' + name + ' (' + stock_value['symbol'] + ') costs $' + str(stock_value['price'])
             return render_template("quoted.html", price=msg)
+        elif quotes_unavailable():
+            return apology("Quotes are unavailable, try again shortly", 503)
         else:
             return apology("Quote error:")
         # return render_template("quote.html")
@@ -230,10 +472,23 @@ def sell():
 
             # check if user can sell stock amount
             if owned_count >= sell_count:
+                if app.config["ORDER_QUEUE"]:
+                    # Priced and filled later by the settlement worker
+                    queue_msg = queue_order(symbol, amount, 'sell')
+                    if queue_msg:
+                        return apology(queue_msg)
+                    flash("Order queued")
+                    return redirect("/orders")
                 # Sell shares
-                stock_value = lookup(symbol)
-                make_trade(stock_value, amount, 'sell')
-                session["msg"] = 'Sold!' # msg
+                stock_value = lookup_quotes([symbol]).get(symbol)
+                if not stock_value and quotes_unavailable():
+                    return apology("Quotes are unavailable, try again shortly", 503)
+                if not stock_value:
+                    return apology("Quote error:")
+                trade_msg = make_trade(stock_value, amount, 'sell')
+                if trade_msg:
+                    return apology(trade_msg)
+                flash('Sold!')
             else:
                 msg = "You have " + str(owned_count) + " shares of " + symbol
                 return apology(msg)
@@ -247,9 +502,15 @@ def sell():
         symbol = request.args.get('symbol')
         if symbol:
             # Sympol form quick sell on main page
-            return render_template("sell.html", stocks=stocks, symbol=symbol)
+            return render_template("sell.html", stocks=stocks, names=get_portfolio_names(stocks), symbol=symbol)
         else:
-            return render_template("sell.html", stocks=stocks)
+            return render_template("sell.html", stocks=stocks, names=get_portfolio_names(stocks))
+
+@app.route("/orders")
+@login_required
+def orders():
+    """Show queued orders and how they settled"""
+    return render_template("orders.html", orders=get_user_orders())
 
 @app.route("/profile", methods=["GET", "POST"])
 @login_required
@@ -257,7 +518,7 @@ def profile():
     """Sell shares of stock"""
     user = get_user()
     if request.method == "POST":
-        msg =  update_user(request)
+        msg = update_user(request.form, user)
         if msg == 'Profile Updated!':
             return redirect("/")
         else:
@@ -268,10 +529,94 @@ def profile():
         return render_template("profile.html", username=user.username)
 
 
+@app.route("/api/v1/portfolio")
+@api_login_required
+async def api_portfolio():
+    """Portfolio with current prices as JSON"""
+    user = get_user()
+    portfolio = await get_portfolio_valuation_async(user.cash if user else None)
+    return jsonify(portfolio.as_dict())
+
+@app.route("/api/v1/quotes")
+@api_login_required
+async def api_quotes():
+    """Quotes for a comma separated list of symbols in one batched lookup"""
+    symbols = parse_symbol_list(request.args.get("symbols", ""))
+    if not symbols:
+        return api_error("Missing symbols")
+    if len(symbols) > app.config["API_MAX_SYMBOLS"]:
+        return api_error(f"At most {app.config['API_MAX_SYMBOLS']} symbols per request")
+
+    # Unlisted symbols are answered without an upstream call
+    listed = [symbol for symbol in symbols if known_symbol(symbol)]
+    quotes = await lookup_quotes_async(listed)
+    # Listed symbols the breaker refused to look up are not unknown
+    if any(symbol not in quotes for symbol in listed) and quotes_unavailable():
+        return api_error("Quotes are unavailable, try again shortly", 503)
+    return jsonify({
+        "quotes": [
+            {"symbol": symbol, "price": quotes[symbol]["price"]} for symbol in symbols if symbol in quotes
+        ],
+        "unknown": [symbol for symbol in symbols if symbol not in quotes],
+    })
+
+@app.route("/api/v1/symbols")
+@api_login_required
+def api_symbols():
+    """Autocomplete listed symbols and company names from the in-memory index"""
+    query = request.args.get("q", "")
+    limit = min(max(request.args.get("limit", 10, type=int), 1), app.config["API_MAX_SYMBOLS"])
+    matches = symbol_index.search(query, limit) if symbol_index is not None else []
+    return jsonify({"symbols": [{"symbol": symbol, "name": name} for symbol, name in matches]})
+
+@app.route("/api/v1/trades", methods=["POST"])
+@api_login_required
+def api_trades():
+    """Execute a list of orders in one transaction"""
+    payload = request.get_json(silent=True)
+    orders, msg = parse_orders(payload.get("orders") if isinstance(payload, dict) else None)
+    if msg:
+        return api_error(msg)
+
+    # Price every distinct symbol with one batched lookup before touching the database,
+    # buys of unlisted symbols are refused without a lookup
+    unlisted = {
+        order["symbol"] for order in orders if order["trade_type"] == "buy" and not known_symbol(order["symbol"])
+    }
+    quotes = lookup_quotes({order["symbol"] for order in orders} - unlisted)
+    unknown = sorted({order["symbol"] for order in orders if order["symbol"] not in quotes})
+    if set(unknown) - unlisted and quotes_unavailable():
+        return api_error("Quotes are unavailable, try again shortly", 503)
+    if unknown:
+        return api_error("Unknown symbol: " + ", ".join(unknown))
+    for order in orders:
+        order["price"] = quotes[order["symbol"]]["price"]
+
+    trade_msg = execute_trades(session["user_id"], orders)
+    if trade_msg:
+        return api_error(trade_msg, 409)
+
+    user = get_user()
+    return jsonify({
+        "trades": [
+            {
+                "symbol": order["symbol"],
+                "shares": order["share_count"],
+                "type": order["trade_type"],
+                "price": order["price"],
+            }
+            for order in orders
+        ],
+        "cash": round(float(user.cash), 2),
+    }), 201
+
+
 def errorhandler(e):
     """Handle error"""
     if not isinstance(e, HTTPException):
         e = InternalServerError()
+    if request.path.startswith("/api/"):
+        return api_error(e.name, e.code)
     return apology(e.name, e.code)
 
 
@@ -292,12 +637,12 @@ def buy_stock(symbol, amount):
     else:
         return
 
-# Get user data
+# Get user data, loaded at most once per request
 def get_user():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    if "user" not in g:
+        user_id = session.get("user_id")
+        g.user = db.session.get(User, user_id) if user_id else None
+    return g.user
 
 # Update user data
 def update_user(form, user):
@@ -319,57 +664,124 @@ def update_user(form, user):
 
     user.username = new_username
     db.session.commit()
-    session["msg"] = "Profile Updated!"
+    flash("Profile Updated!")
     return "Profile Updated!"
 
-# Get user balance
-def get_user_balance():
-    user = get_user()
-    if not user:
-        return None
-    return user.cash
+# Buy stock
+def make_trade(stock_value, share_count, trade_type):
+    return execute_trade(
+        session["user_id"], stock_value['symbol'], stock_value['price'], share_count, trade_type
+    )
 
-# Save user balance
-def set_user_balance(user_id, user_balance):
-    user = User.query.get(user_id)
-    if not user:
-        return
-    user.cash = Decimal(str(user_balance))
+# Run a whole trade in one transaction
+def execute_trade(user_id, symbol, price, share_count, trade_type):
+    return execute_trades(user_id, [
+        {"symbol": symbol, "price": price, "share_count": share_count, "trade_type": trade_type}
+    ])
+
+# Run several trades in one transaction, either all of them go through or none
+def execute_trades(user_id, orders):
+    try:
+        begin_trade_transaction()
+        for order in orders:
+            trade_msg = apply_trade(user_id, order)
+            if trade_msg:
+                return trade_msg
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+# Apply one trade inside the open transaction, rolls it back on failure
+def apply_trade(user_id, order):
+    symbol = order["symbol"]
+    share_count = order["share_count"]
+    trade_type = order["trade_type"]
+    price = Decimal(str(order["price"]))
+
+    # Cash is checked and moved in the UPDATE itself, which also locks the user row
+    if not update_user_cash(user_id, price * share_count, trade_type):
+        db.session.rollback()
+        return "Insufficient funds" if trade_type == 'buy' else "DB error"
+
+    # Position update is a single statement that also checks owned shares
+    if not update_user_portfolio(symbol, user_id, share_count, trade_type, price):
+        db.session.rollback()
+        owned_count = db.session.scalar(
+            db.select(PortfolioPosition.share_count).filter_by(user_id=user_id, symbol=symbol)
+        ) or 0
+        return "You have " + str(owned_count) + " shares of " + symbol
+
+    log_trade(symbol, user_id, price, share_count, trade_type)
+
+# Queue an order for the settlement worker, returns an error message when it can't be queued
+def queue_order(symbol, share_count, trade_type):
+    symbol = normalize_symbol(symbol)
+    if not symbol:
+        return "Missing Symbol"
+    # Sells come from held positions, buys must be listed symbols
+    if not valid_symbol(symbol) or (trade_type == 'buy' and not known_symbol(symbol)):
+        return "Unknown Symbol"
+    db.session.add(Order(
+        user_id=session["user_id"], symbol=symbol, share_count=share_count, trade_type=trade_type
+    ))
     db.session.commit()
 
+# Most recent orders of the current user
+def get_user_orders():
+    return (
+        Order.query.filter_by(user_id=session["user_id"])
+        .order_by(Order.id.desc())
+        .limit(app.config["ORDERS_PAGE_SIZE"])
+        .all()
+    )
 
-# Buy stock
-def make_trade(stock_value, share_count, trade_type):
-    balance = get_user_balance()
-    price = stock_value['price']
-    if balance:
-        symbol = stock_value['symbol']
-        user_id = session["user_id"]
-        if trade_type == 'buy':
-
-            if can_buy_check(balance, price, share_count):
-                # User can buy shares
-                log_trade(symbol, user_id, price, share_count, trade_type)
-                post_trade_balance = balance - Decimal(price * share_count)
-                set_user_balance(user_id,post_trade_balance)
-                return
-            else:
-                # Insufficient funds
-                return "Insufficient funds"
-        else:
-            # Selling shares
-            log_trade(symbol, user_id, price, share_count, trade_type)
-            post_trade_balance = balance + Decimal(price * share_count)
-            set_user_balance(user_id, post_trade_balance)
-    else:
-        return "DB error"
-
-# Check if user has enough funds
-def can_buy_check(user_balance, price, share_count):
-    if (price * share_count ) < user_balance:
-        return True
+# Split a comma separated symbol list, normalized and without duplicates
+def parse_symbol_list(text):
+    symbols = (normalize_symbol(symbol) for symbol in text.split(","))
+    return list(dict.fromkeys(symbol for symbol in symbols if symbol))
+
+# Validate API orders, returns (orders, error message)
+def parse_orders(items):
+    if not isinstance(items, list) or not items:
+        return None, "Missing orders"
+    if len(items) > app.config["API_MAX_ORDERS"]:
+        return None, f"At most {app.config['API_MAX_ORDERS']} orders per request"
+
+    orders = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None, "Orders must be objects"
+        symbol = normalize_symbol(item.get("symbol")) if isinstance(item.get("symbol"), str) else ""
+        shares = item.get("shares")
+        trade_type = item.get("type")
+        if not symbol:
+            return None, "Missing Symbol"
+        # bool is an int subclass, reject true/false explicitly
+        if not isinstance(shares, int) or isinstance(shares, bool) or shares < 1:
+            return None, "Amount should be higher than 0"
+        if trade_type not in ("buy", "sell"):
+            return None, "Order type should be buy or sell"
+        orders.append({"symbol": symbol, "share_count": shares, "trade_type": trade_type})
+    return orders, None
+
+# Take the write locks a trade needs
+def begin_trade_transaction():
+    connection = db.session.connection()
+    if connection.dialect.name == "sqlite":
+        # SQLite has no row locks, take the database write lock up front instead
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+# Move cash for a trade, buys only go through when the user can afford them
+def update_user_cash(user_id, amount, trade_type):
+    statement = db.update(User).where(User.id == user_id)
+    if trade_type == 'buy':
+        statement = statement.where(User.cash > amount).values(cash=User.cash - amount)
     else:
-        return False
+        statement = statement.values(cash=User.cash + amount)
+    result = db.session.execute(statement.execution_options(synchronize_session=False))
+    return result.rowcount == 1
 
 # Save trade to log
 def log_trade(symbol, user_id, stock_price, share_count, trade_type):
@@ -383,23 +795,49 @@ def log_trade(symbol, user_id, stock_price, share_count, trade_type):
         trade_type=trade_type,
     )
     db.session.add(trade)
-    update_user_portfolio(symbol, user_id, share_count, trade_type)
 
-# Get user history
-def get_user_history():
+# ETag of a history page, built from the user's latest trade id
+def get_history_etag(cursor, page_size):
+    if "_flashes" in session:
+        # A pending flash message has to be rendered
+        return None
     user_id = session.get("user_id")
-    if not user_id:
-        return []
+    latest = db.session.scalar(
+        db.select(db.func.max(TradeHistory.id)).filter_by(user_id=user_id)
+    )
+    return hashlib.sha256(f"{user_id}:{latest}:{cursor}:{page_size}".encode()).hexdigest()[:16]
 
+# Get one page of user history, newest first
+def get_user_history(cursor, page_size):
+    user_id = session.get("user_id")
+    if not user_id:
+        return [], None
+
+    query = TradeHistory.query.filter_by(user_id=user_id)
+    if cursor:
+        # Keyset pagination, resumes right after the trade the previous page ended on.
+        # Its timestamp is read in SQL so the comparison uses the stored value as is.
+        cursor_timestamp = (
+            db.select(TradeHistory.timestamp)
+            .filter_by(id=cursor, user_id=user_id)
+            .scalar_subquery()
+        )
+        query = query.filter(
+            db.tuple_(TradeHistory.timestamp, TradeHistory.id) < db.tuple_(cursor_timestamp, cursor)
+        )
     rows = (
-        TradeHistory.query.filter_by(user_id=user_id)
-        .order_by(TradeHistory.timestamp.asc())
+        query.order_by(TradeHistory.timestamp.desc(), TradeHistory.id.desc())
+        .limit(page_size + 1)
         .all()
     )
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = rows[-1].id
     if not rows:
         return [
             {"stock_price": "", "symbol": "", "share_count": "", "timestamp": "", "trade_type": ""}
-        ]
+        ], None
 
     return [
         {
@@ -410,7 +848,65 @@ def get_user_history():
             "timestamp": trade.timestamp.strftime("%Y-%m-%d %H:%M:%S") if trade.timestamp else "",
         }
         for trade in rows
-    ]
+    ], next_cursor
+
+HISTORY_EXPORT_MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+HISTORY_EXPORT_COLUMNS = ["timestamp", "trade_type", "symbol", "share_count", "stock_price"]
+
+# Stream all user history, oldest first, without loading it all at once
+def stream_user_history(user_id):
+    result = db.session.execute(
+        db.select(
+            TradeHistory.timestamp, TradeHistory.trade_type, TradeHistory.symbol,
+            TradeHistory.share_count, TradeHistory.stock_price,
+        )
+        .filter_by(user_id=user_id)
+        .order_by(TradeHistory.timestamp.asc(), TradeHistory.id.asc())
+        # Server side cursor fetching a chunk of rows at a time
+        .execution_options(yield_per=app.config["HISTORY_EXPORT_CHUNK"])
+    )
+    for partition in result.partitions():
+        yield [
+            {
+                "timestamp": row.timestamp.strftime("%Y-%m-%d %H:%M:%S") if row.timestamp else "",
+                "trade_type": row.trade_type,
+                "symbol": row.symbol,
+                "share_count": row.share_count,
+                "stock_price": f"{row.stock_price:.2f}",
+            }
+            for row in partition
+        ]
+
+def history_csv_chunks(partitions):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=HISTORY_EXPORT_COLUMNS)
+    writer.writeheader()
+    for trades in partitions:
+        writer.writerows(trades)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def history_ndjson_chunks(partitions):
+    for trades in partitions:
+        yield "".join(json.dumps(trade) + "\n" for trade in trades)
+
+# Replay user history against daily closes
+def get_portfolio_value_history(user_id):
+    trades = db.session.execute(
+        db.select(
+            TradeHistory.timestamp, TradeHistory.symbol, TradeHistory.trade_type,
+            TradeHistory.share_count, TradeHistory.stock_price,
+        ).filter_by(user_id=user_id)
+    ).all()
+    if not trades:
+        return None
+
+    trades = trades_frame(trades)
+    closes = price_store.closes(trades["symbol"].unique(), trades["date"].min().date())
+    cash = db.session.scalar(db.select(User.cash).filter_by(id=user_id)) or Decimal("0")
+    return portfolio_value_series(trades, closes, float(cash))
 
 # get portfolio
 def get_user_portfolio():
@@ -426,57 +922,423 @@ def get_user_portfolio():
     )
     if not rows:
         return [{"symbol": "", "share_count": 0}]
-    return [{"symbol": row.symbol, "share_count": row.share_count} for row in rows]
+    return [
+        {
+            "symbol": row.symbol,
+            "share_count": row.share_count,
+            "cost_basis": row.cost_basis,
+            "realized_pnl": row.realized_pnl,
+        }
+        for row in rows
+    ]
+
+# Realized P&L over every position the user ever held, closed ones included
+def get_user_realized_pnl():
+    return db.session.scalar(
+        db.select(db.func.coalesce(db.func.sum(PortfolioPosition.realized_pnl), 0))
+        .filter_by(user_id=session.get("user_id"))
+    )
 
 
 # get port with current prices
-def get_portfolio_with_price(with_usd_format):
+def get_portfolio_valuation(cash_balance):
+    stocks = get_user_portfolio()
+    # Price every position with one batched lookup
+    quotes = lookup_quotes(stock['symbol'] for stock in stocks if stock['symbol'] != '')
+    return PortfolioValuation(
+        stocks, quotes, get_portfolio_names(stocks), cash_balance, get_user_realized_pnl()
+    )
+
+# Same as get_portfolio_valuation, with the quotes awaited together on the event loop
+async def get_portfolio_valuation_async(cash_balance):
     stocks = get_user_portfolio()
-    for stock in stocks:
-        if stock['symbol'] != '':
-            # Stock isnt empty
-            stock_value = lookup(stock["symbol"])
-            stock['name'] = stock_value['name']
-
-            if with_usd_format:
-                # Returns with values formatted for ui
-                stock['price'] = usd(stock_value['price'])
-                stock['total'] = usd((stock['share_count']) * stock_value['price'])
+    quotes = await lookup_quotes_async(stock['symbol'] for stock in stocks if stock['symbol'] != '')
+    return PortfolioValuation(
+        stocks, quotes, get_portfolio_names(stocks), cash_balance, get_user_realized_pnl()
+    )
+
+# Get company names for portfolio rows
+def get_portfolio_names(stocks):
+    return get_symbol_names(stock['symbol'] for stock in stocks if stock['symbol'] != '')
+
+# Get company names from the symbol metadata store
+def get_symbol_names(symbols):
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+
+    now = utcnow()
+    rows = {row.symbol: row for row in SymbolMetadata.query.filter(SymbolMetadata.symbol.in_(symbols))}
+    names = {symbol: row.name for symbol, row in rows.items()}
+
+    # Fill missing or expired names in bulk
+    expired = now - app.config["SYMBOL_NAME_TTL"]
+    stale = [symbol for symbol in symbols if symbol not in rows or rows[symbol].updated_at < expired]
+    if stale:
+        # Symbols without a name are stored empty, so they aren't looked up again until they expire
+        fetched = lookup_company_names(stale)
+        for symbol, name in fetched.items():
+            if symbol in rows:
+                rows[symbol].name = name or rows[symbol].name
+                rows[symbol].updated_at = now
             else:
-                # Returns with numerical values
-                stock['price'] = stock_value['price']
-                stock['total'] = (stock['share_count']) * stock_value['price']
+                db.session.add(SymbolMetadata(symbol=symbol, name=name, updated_at=now))
+            names[symbol] = name or names.get(symbol, "")
+        if fetched:
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another request stored the same symbol first
+                db.session.rollback()
+    # Empty placeholders read as not found
+    return {symbol: name for symbol, name in names.items() if name}
+
+# update portfolio, keeping average cost basis and realized P&L current
+def update_user_portfolio(symbol, user_id, share_count, trade_type, price):
+    if trade_type == "buy":
+        # Insert the position or add to it in one statement
+        insert = POSITION_UPSERT_INSERTS[db.session.get_bind().dialect.name]
+        statement = insert(PortfolioPosition.__table__).values(
+            symbol=symbol, user_id=user_id, share_count=share_count, cost_basis=price * share_count
+        )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=["user_id", "symbol"],
+            set_={
+                "share_count": PortfolioPosition.share_count + statement.excluded.share_count,
+                "cost_basis": PortfolioPosition.cost_basis + statement.excluded.cost_basis,
+            },
+        ))
+        return True
+
+    # Sold shares take their average cost out of the basis, the rest is realized
+    sold = db.literal(Decimal(share_count), db.Numeric(15, 2))
+    sold_cost = PortfolioPosition.cost_basis * sold / PortfolioPosition.share_count
+    # Only sell shares the user actually owns
+    result = db.session.execute(
+        db.update(PortfolioPosition)
+        .where(
+            PortfolioPosition.user_id == user_id,
+            PortfolioPosition.symbol == symbol,
+            PortfolioPosition.share_count >= share_count,
+        )
+        .values(
+            share_count=PortfolioPosition.share_count - share_count,
+            cost_basis=PortfolioPosition.cost_basis - sold_cost,
+            realized_pnl=PortfolioPosition.realized_pnl + price * share_count - sold_cost,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
 
-    return stocks
+# Dialect specific INSERT constructs supporting ON CONFLICT
+POSITION_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
 
-# update portfolio
-def update_user_portfolio(symbol, user_id, share_count, trade_type):
 
-    # check if stock is in portfolio
-    position = PortfolioPosition.query.filter_by(user_id=user_id, symbol=symbol).first()
-    if position:
-        # Update portfolio
-        if trade_type == "buy":
-            position.share_count += share_count
-        else:
-            position.share_count -= share_count
+# Current UTC time as stored in naive DateTime columns
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Read fresh enough quotes from the shared store
+def read_stored_quotes(symbols):
+    # Inside a request reuse its session, a second one would hold a second pooled connection
+    if not has_app_context():
+        # Cache refresh threads have no app context of their own
+        with app.app_context():
+            return read_stored_quotes(symbols)
+
+    cutoff = utcnow() - app.config["QUOTE_STORE_MAX_AGE"]
+    rows = StoredQuote.query.filter(
+        StoredQuote.symbol.in_(symbols), StoredQuote.updated_at >= cutoff
+    )
+    return {row.symbol: {"price": row.price, "symbol": row.symbol} for row in rows}
+
+# Read quotes from the shared store, falling back to upstream for the rest
+def fetch_stored_quotes(symbols):
+    symbols = list(symbols)
+    quotes = read_stored_quotes(symbols)
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    if missing:
+        quotes.update(fetch_quotes(missing))
+    return quotes
+
+# Async version of fetch_stored_quotes, upstream calls are awaited together
+async def fetch_stored_quotes_async(symbols):
+    symbols = list(symbols)
+    # The store read is one short query, keep it off the event loop
+    quotes = await asyncio.to_thread(read_stored_quotes, symbols)
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    if missing:
+        quotes.update(await fetch_quotes_async(missing))
+    return quotes
+
+def fetch_stored_quote(symbol):
+    return fetch_stored_quotes([symbol]).get(symbol)
+
+quote_cache.fetch = fetch_stored_quote
+quote_cache.fetch_many = fetch_stored_quotes
+quote_cache.fetch_many_async = fetch_stored_quotes_async
+
+
+# Re-price every held symbol into the shared quote store
+def refresh_stored_quotes():
+    symbols = [
+        symbol for (symbol,) in db.session.query(PortfolioPosition.symbol)
+        .filter(PortfolioPosition.share_count > 0)
+        .distinct()
+        .order_by(PortfolioPosition.symbol)
+    ]
+    batch_size = app.config["QUOTE_REFRESH_BATCH"]
+    refreshed = 0
+    for start in range(0, len(symbols), batch_size):
+        batch = symbols[start:start + batch_size]
+        quotes = fetch_quotes(batch)
+        now = utcnow()
+        rows = {row.symbol: row for row in StoredQuote.query.filter(StoredQuote.symbol.in_(batch))}
+        for symbol, quote in quotes.items():
+            if symbol in rows:
+                rows[symbol].price = quote["price"]
+                rows[symbol].updated_at = now
+            else:
+                db.session.add(StoredQuote(symbol=symbol, price=quote["price"], updated_at=now))
         db.session.commit()
-    else:
-        # insert into portfolio
-        position = PortfolioPosition(symbol=symbol, user_id=user_id, share_count=share_count)
-        db.session.add(position)
+        refreshed += len(quotes)
+    return refreshed
+
+
+quotes_cli = AppGroup("quotes", help="Market data commands.")
+
+@quotes_cli.command("refresh")
+@click.option("--interval", type=int, default=None, help="Seconds between refreshes.")
+@click.option("--once", is_flag=True, help="Refresh a single time and exit.")
+def refresh_quotes_command(interval, once):
+    """Keep the shared quote store fresh for every held symbol."""
+    interval = interval or app.config["QUOTE_REFRESH_INTERVAL"]
+    while True:
+        started = time.monotonic()
+        refreshed = refresh_stored_quotes()
+        print(f"Refreshed {refreshed} quotes in {time.monotonic() - started:.2f}s")
+        if once:
+            break
+        time.sleep(max(0, interval - (time.monotonic() - started)))
+
+app.cli.add_command(quotes_cli)
+
+
+# Rebuild cost basis and realized P&L of every position from history
+def backfill_position_pnl():
+    chunk_size = app.config["HISTORY_EXPORT_CHUNK"]
+    result = db.session.execute(
+        db.select(
+            TradeHistory.user_id, TradeHistory.symbol, TradeHistory.trade_type,
+            TradeHistory.share_count, TradeHistory.stock_price,
+        )
+        .order_by(TradeHistory.timestamp.asc(), TradeHistory.id.asc())
+        .execution_options(yield_per=chunk_size)
+    )
+
+    # Replay trades per position: [share_count, cost_basis, realized_pnl]
+    ledger = {}
+    for trade in result:
+        state = ledger.setdefault((trade.user_id, trade.symbol), [0, Decimal("0"), Decimal("0")])
+        amount = trade.stock_price * trade.share_count
+        if trade.trade_type == "buy":
+            state[0] += trade.share_count
+            state[1] += amount
+        elif state[0] > 0:
+            sold_cost = state[1] * trade.share_count / state[0]
+            state[0] -= trade.share_count
+            state[1] -= sold_cost
+            state[2] += amount - sold_cost
+
+    positions = db.session.execute(
+        db.select(PortfolioPosition.id, PortfolioPosition.user_id, PortfolioPosition.symbol)
+    )
+    updates = []
+    for position in positions:
+        state = ledger.get((position.user_id, position.symbol))
+        if state:
+            updates.append({"id": position.id, "cost_basis": state[1], "realized_pnl": state[2]})
+    for start in range(0, len(updates), chunk_size):
+        db.session.execute(db.update(PortfolioPosition), updates[start:start + chunk_size])
+    db.session.commit()
+    return len(updates)
+
+
+# Settle a batch of pending orders, returns how many were settled
+def settle_orders():
+    pending = claim_pending_orders()
+    if not pending:
+        return 0
+
+    # One batched quote fetch prices every distinct symbol in the batch
+    quotes = lookup_quotes({order.symbol for order in pending})
+    # Without a quote an order waits for the next run, unless upstream said the symbol doesn't exist
+    deferred = {
+        order.id for order in pending
+        if order.symbol not in quotes and order.symbol not in unresolved_symbols
+    }
+    release_orders(deferred)
+
+    by_user = {}
+    for order in pending:
+        if order.id not in deferred:
+            by_user.setdefault(order.user_id, []).append(order)
+    settled = len(pending) - len(deferred)
+    for user_id, user_orders in by_user.items():
+        try:
+            settle_user_orders(user_id, user_orders, quotes)
+        except Exception as e:
+            # Nothing of this user's batch was committed, hand it back to the queue
+            db.session.rollback()
+            print("Settling orders of user", user_id, "failed:", e)
+            release_orders(order.id for order in user_orders)
+            settled -= len(user_orders)
+    return settled
+
+# Mark the oldest pending orders as settling, returns only the ones this worker claimed
+def claim_pending_orders():
+    now = utcnow()
+    # Pending orders, and orders a crashed worker claimed too long ago
+    claimable = db.or_(
+        Order.status == "pending",
+        db.and_(Order.status == "settling", Order.claimed_at < now - app.config["ORDER_CLAIM_TIMEOUT"]),
+    )
+    ids = db.session.scalars(
+        db.select(Order.id)
+        .where(claimable)
+        .order_by(Order.id)
+        .limit(app.config["ORDER_SETTLE_BATCH"])
+    ).all()
+    if not ids:
+        db.session.commit()
+        return []
+    # Repeating the condition makes the claim atomic, a parallel worker's rows are skipped
+    claimed = db.session.execute(
+        db.update(Order)
+        .where(Order.id.in_(ids), claimable)
+        .values(status="settling", claimed_at=now)
+        .returning(Order.id, Order.user_id, Order.symbol, Order.share_count, Order.trade_type),
+        execution_options={"synchronize_session": False},
+    ).all()
+    # Don't hold the transaction open while quotes are fetched
+    db.session.commit()
+    return sorted(claimed, key=lambda order: order.id)
+
+# Put claimed orders back in the queue for the next run
+def release_orders(ids):
+    ids = list(ids)
+    if not ids:
+        return
+    db.session.execute(
+        db.update(Order).where(Order.id.in_(ids)).values(status="pending", claimed_at=None),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+
+# Fill one user's orders in a single transaction, refused orders are rejected
+def settle_user_orders(user_id, orders, quotes):
+    # Symbols upstream doesn't know are rejected without touching the account
+    rejected = {
+        order.id: "Unknown Symbol" for order in orders if order.symbol not in quotes
+    }
+    while True:
+        trade_msg = None
+        begin_trade_transaction()
+        for order in orders:
+            if order.id in rejected:
+                continue
+            trade_msg = apply_trade(user_id, {
+                "symbol": order.symbol,
+                "price": quotes[order.symbol]["price"],
+                "share_count": order.share_count,
+                "trade_type": order.trade_type,
+            })
+            if trade_msg:
+                # apply_trade rolled everything back, retry without this order
+                rejected[order.id] = trade_msg
+                break
+        if not trade_msg:
+            break
+
+    now = utcnow()
+    db.session.execute(db.update(Order), [
+        {
+            "id": order.id,
+            "status": "rejected" if order.id in rejected else "filled",
+            "message": rejected.get(order.id),
+            "price": None if order.id in rejected else quotes[order.symbol]["price"],
+            "settled_at": now,
+        }
+        for order in orders
+    ])
+    db.session.commit()
+
+
+orders_cli = AppGroup("orders", help="Order queue commands.")
+
+@orders_cli.command("settle")
+@click.option("--interval", type=float, default=None, help="Seconds between polls of an empty queue.")
+@click.option("--once", is_flag=True, help="Settle a single batch and exit.")
+def settle_orders_command(interval, once):
+    """Drain queued /buy and /sell orders."""
+    interval = interval or app.config["ORDER_SETTLE_INTERVAL"]
+    while True:
+        started = time.monotonic()
+        settled = settle_orders()
+        if settled:
+            print(f"Settled {settled} orders in {time.monotonic() - started:.2f}s")
+        if once:
+            break
+        # Keep draining while there is a backlog
+        if settled < app.config["ORDER_SETTLE_BATCH"]:
+            time.sleep(interval)
+
+app.cli.add_command(orders_cli)
+
+
+portfolio_cli = AppGroup("portfolio", help="Portfolio maintenance commands.")
+
+@portfolio_cli.command("backfill-pnl")
+def backfill_pnl_command():
+    """Replay trade history into position cost basis and realized P&L."""
+    print(f"Backfilled {backfill_position_pnl()} positions")
 
+app.cli.add_command(portfolio_cli)
 
-# Get user total asset value
-def total_value(cash_balance):
-    stocks = get_portfolio_with_price(False)
-    ret_val = cash_balance or Decimal("0")
-    for stock in stocks:
-        if stock['symbol'] != '':
-            # Add value of stock
-            ret_val += Decimal(str(stock["total"]))
 
-    return ret_val
+prices_cli = AppGroup("prices", help="Local price history commands.")
+
+@prices_cli.command("sync")
+@click.argument("symbols", nargs=-1)
+def sync_prices_command(symbols):
+    """Load or extend local price history, for every traded symbol by default."""
+    if not symbols:
+        symbols = db.session.scalars(
+            db.select(TradeHistory.symbol).distinct().order_by(TradeHistory.symbol)
+        ).all()
+    symbols = [normalize_symbol(symbol) for symbol in symbols]
+    batch_size = app.config["QUOTE_REFRESH_BATCH"]
+    for start in range(0, len(symbols), batch_size):
+        for symbol, added in price_store.sync(symbols[start:start + batch_size]).items():
+            print(f"{symbol}: {added} new days")
+
+app.cli.add_command(prices_cli)
+
+
+symbols_cli = AppGroup("symbols", help="Symbol index commands.")
+
+@symbols_cli.command("update")
+def update_symbols_command():
+    """Merge the current US exchange listings into the symbol index file."""
+    if symbol_index is None:
+        print("SYMBOL_INDEX_FILE is empty, there is no index to update")
+        return
+    index = SymbolIndex([*symbol_index.names.items(), *download_listings()])
+    index.save(SYMBOL_INDEX_FILE)
+    print(f"Wrote {len(index)} symbols ({len(index) - len(symbol_index)} new) to {SYMBOL_INDEX_FILE}")
+
+app.cli.add_command(symbols_cli)
 
 
 if __name__ == '__main__':
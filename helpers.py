@@ -1,17 +1,37 @@
+import asyncio
+import inspect
 import os
-from typing import Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, Optional
 
 # Avoid macOS Accelerate longdouble issues triggered when numpy initializes.
 os.environ.setdefault("NPY_DISABLE_LONGDOUBLE", "1")
 
 from dotenv import load_dotenv
 
-from flask import redirect, render_template, request, session
+from flask import jsonify, redirect, render_template, request, session
 from functools import wraps
-import yfinance as yf
+
+from instrumentation import timed
+from providers import TRANSPORT_ERRORS, create_quote_provider
+from symbols import SymbolIndex
 
 load_dotenv()
 
+# Where quotes and company names come from, QUOTE_PROVIDER=yfinance|synthetic|replay
+quote_provider = create_quote_provider(os.environ)
+
+# Listed symbols for autocomplete and input validation, an empty SYMBOL_INDEX_FILE accepts any well formed symbol
+SYMBOL_INDEX_FILE = os.getenv(
+    "SYMBOL_INDEX_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "symbols.csv")
+)
+symbol_index = SymbolIndex.load(SYMBOL_INDEX_FILE) if SYMBOL_INDEX_FILE else None
+
 
 def apology(message, code=400):
     """Render message as an apology to user."""
@@ -43,27 +63,653 @@ def login_required(f):
     return decorated_function
 
 
-def lookup(symbol: str) -> Optional[dict]:
-    """Look up quote for symbol via yfinance."""
-    if not symbol:
-        return None
+def api_login_required(f):
+    """Decorate API routes, sync or async, to require login, answering 401 instead of redirecting."""
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            if session.get("user_id") is None:
+                return api_error("Login required", 401)
+            return await f(*args, **kwargs)
+        return decorated_coroutine
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get("user_id") is None:
+            return api_error("Login required", 401)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def api_error(message, code=400):
+    """JSON counterpart of `apology` for API routes."""
+    return jsonify({"error": message}), code
+
+
+def normalize_symbol(symbol: Optional[str]) -> str:
+    """Normalize a user supplied symbol to the form used as cache key."""
+    return (symbol or "").strip().upper()
+
+
+# Yahoo notation: AAPL, BRK-B, RDS.A, 0700.HK, EURUSD=X, ^GSPC
+SYMBOL_PATTERN = re.compile(r"\^?[A-Z0-9][A-Z0-9.=-]{0,14}")
+
+
+def valid_symbol(symbol: str) -> bool:
+    """Whether a normalized symbol is well formed."""
+    return SYMBOL_PATTERN.fullmatch(symbol) is not None
+
 
-    symbol = symbol.strip().upper()
+def known_symbol(symbol: str) -> bool:
+    """Whether a normalized symbol is listed, checked before spending an upstream call on it."""
+    return valid_symbol(symbol) and (symbol_index is None or symbol in symbol_index)
+
+
+def fetch_quote(symbol: str) -> Optional[dict]:
+    """
+    Fetch a fresh last price for an already normalized symbol.
+
+    Symbols that recently did not resolve, and every symbol while the
+    upstream circuit breaker is open, return None without an upstream call.
+    Only failures to reach upstream count towards opening the breaker.
+    """
+    if symbol in unresolved_symbols or not quote_breaker.allow():
+        return None
     # Contact API
     try:
-        ticker = yf.Ticker(symbol)
-        name = ticker.info.get("shortName")
-        price = ticker.fast_info["last_price"]
-        return {
-            "name": name if name else "Not Found",
-            "price": float(price) if price else float(0),
-            "symbol": symbol
-        }
+        quote = quote_provider.quote(symbol)
+    except Exception as e:
+        return _failed(e)
+    return _resolved(symbol, quote)
+
+
+def fetch_company_name(symbol: str) -> Optional[str]:
+    """
+    Fetch the company name for an already normalized symbol.
+
+    Returns "" when upstream answered without a name and None when the
+    call failed or was refused, so callers only remember real answers.
+    """
+    if not quote_breaker.allow():
+        return None
+    try:
+        name = quote_provider.company_name(symbol)
+    except Exception as e:
+        return _failed(e)
+    quote_breaker.record_success()
+    return name or ""
+
+
+def _failed(error: Exception) -> None:
+    # Only an unreachable upstream trips the breaker, anything else is a bug rather than an outage
+    if isinstance(error, TRANSPORT_ERRORS):
+        quote_breaker.record_failure()
+        print("Quote provider unreachable:", error)
+    else:
+        quote_breaker.record_success()
+        print("Unexpected lookup error:", error)
+    return None
+
+
+def _resolved(symbol: str, quote: Optional[dict]) -> Optional[dict]:
+    # Upstream answered, a symbol it doesn't know is remembered for a while
+    quote_breaker.record_success()
+    if quote is None:
+        unresolved_symbols.add(symbol)
+    return quote
+
+
+def quotes_unavailable() -> bool:
+    """Whether upstream quote calls are currently being refused by the circuit breaker."""
+    # Half-open only lets its single probe through, everyone else is refused too
+    return quote_breaker.state != CircuitBreaker.CLOSED
+
+
+class SingleFlight:
+    """
+    Share one in-flight call per key between concurrent callers.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for and receive the same result, or the same exception. A
+    waiter gives up with TimeoutError after `timeout` seconds.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn: Callable, *args):
+        """Run `fn(*args)` once for every concurrent caller using `key`."""
+        call, leader = self._join(key)
+        if leader:
+            try:
+                call.result = fn(*args)
+            except Exception as e:
+                call.error = e
+            finally:
+                self._finish(key, call)
+        elif not call.done.wait(self.timeout):
+            raise TimeoutError(f"Timed out waiting for in-flight fetch of {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def do_async(self, key, fn: Callable, *args):
+        """
+        Coroutine version of `do`, awaiting `fn(*args)`.
+
+        Sync and async callers share the same in-flight calls. A waiter
+        blocks a worker thread rather than the event loop.
+        """
+        call, leader = self._join(key)
+        if leader:
+            try:
+                call.result = await fn(*args)
+            except Exception as e:
+                call.error = e
+            finally:
+                self._finish(key, call)
+        elif not call.done.is_set() and not await asyncio.to_thread(call.done.wait, self.timeout):
+            raise TimeoutError(f"Timed out waiting for in-flight fetch of {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+        return call, leader
+
+    def _finish(self, key, call):
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+
+class CircuitBreaker:
+    """
+    Fail fast while an upstream service is down.
+
+    After `threshold` consecutive failures the breaker opens and calls are
+    refused for `cooldown` seconds. Then a single trial call is let through
+    (half-open): its success closes the breaker, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATES = (CLOSED, OPEN, HALF_OPEN)
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                # This caller makes the trial call
+                self.state = self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        """Return breaker state (0 closed, 1 open, 2 half-open) and counters for monitoring."""
+        with self._lock:
+            return {
+                "state": self.STATES.index(self.state),
+                "consecutive_failures": self.failures,
+                "opens": self.opens,
+                "rejected": self.rejected,
+            }
+
+
+class NegativeCache:
+    """
+    Bounded set of keys that expire `ttl` seconds after being added.
+
+    Remembers symbols upstream did not resolve, so repeated requests for
+    the same bad symbol are answered without another upstream call. The
+    oldest keys are dropped beyond `maxsize`.
+    """
+
+    def __init__(self, ttl: float = 60, maxsize: int = 4096):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._expires = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def add(self, key):
+        with self._lock:
+            self._expires[key] = time.monotonic() + self.ttl
+            self._expires.move_to_end(key)
+            while len(self._expires) > self.maxsize:
+                self._expires.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            expires = self._expires.get(key)
+            if expires is None:
+                return False
+            if expires <= time.monotonic():
+                del self._expires[key]
+                return False
+            self.hits += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._expires.clear()
+            self.hits = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._expires), "hits": self.hits}
+
+
+class QuoteCache:
+    """
+    Process-wide LRU cache of quotes keyed by normalized symbol.
+
+    Entries younger than `ttl` seconds are served from memory. Entries older
+    than `ttl` but still within `ttl + stale_ttl` are returned immediately
+    while they are refreshed on `executor` (stale-while-revalidate).
+    Anything older is fetched again before returning. Failed fetches are not
+    cached. When `fetch_many` is set, cache misses from `get_many` are handed
+    to it in one call instead of being fetched one symbol at a time;
+    `fetch_many_async` plays the same role for `get_many_async`.
+    """
+
+    def __init__(self, fetch: Callable[[str], Optional[dict]], ttl: float = 60,
+                 stale_ttl: float = 300, maxsize: int = 1024,
+                 fetch_many: Optional[Callable[[list], dict]] = None,
+                 fetch_many_async: Optional[Callable[[list], Awaitable[dict]]] = None,
+                 executor: Optional[Executor] = None):
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.fetch_many_async = fetch_many_async
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        # Bounded, so a portfolio going stale at once doesn't start a thread per symbol
+        self._executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="quote-refresh")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def get(self, symbol: str) -> Optional[dict]:
+        """Return the quote for `symbol`, fetching or refreshing as needed."""
+        quote = self._from_cache(symbol)
+        if quote is not None:
+            return quote
+        return self._fetch_and_store(symbol)
+
+    def get_many(self, symbols: Iterable[str]) -> dict:
+        """
+        Return a symbol -> quote map for `symbols`.
+
+        Duplicates are fetched once and cache misses are fetched concurrently
+        on the shared quote pool, so latency follows the slowest single quote.
+        Symbols that fail to resolve are left out of the result.
+        """
+        quotes, missing = self._split(symbols)
+        if not missing:
+            return quotes
+        if self.fetch_many is not None:
+            fetched = self.fetch_many(missing)
+            for symbol, quote in fetched.items():
+                self.put(symbol, quote)
+                quotes[symbol] = dict(quote)
+            return quotes
+
+        if len(missing) == 1:
+            fetched = [self._fetch_and_store(missing[0])]
+        else:
+            fetched = _quote_pool.map(self._fetch_and_store, missing)
+        for symbol, quote in zip(missing, fetched):
+            if quote is not None:
+                quotes[symbol] = quote
+        return quotes
+
+    async def get_many_async(self, symbols: Iterable[str]) -> dict:
+        """
+        Coroutine version of `get_many` for async views.
+
+        Cache misses are awaited together through `fetch_many_async`, so
+        they wait on the running event loop instead of each holding a pool
+        thread.
+        """
+        quotes, missing = self._split(symbols)
+        if missing:
+            fetched = await self.fetch_many_async(missing)
+            for symbol, quote in fetched.items():
+                self.put(symbol, quote)
+                quotes[symbol] = dict(quote)
+        return quotes
+
+    def put(self, symbol: str, quote: dict, fetched_at: Optional[float] = None):
+        """Store `quote` for `symbol`, evicting the least recently used entry."""
+        if fetched_at is None:
+            fetched_at = time.monotonic()
+        with self._lock:
+            self._entries[symbol] = (fetched_at, dict(quote))
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached quote and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.stale_hits = self.misses = 0
+            self.refreshes = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return cache counters for sizing and monitoring."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+            }
+
+    def _split(self, symbols: Iterable[str]) -> tuple:
+        # Cached quotes by symbol, and the symbols that need fetching
+        quotes = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            quote = self._from_cache(symbol)
+            if quote is not None:
+                quotes[symbol] = quote
+            else:
+                missing.append(symbol)
+        return quotes, missing
+
+    def _from_cache(self, symbol: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                fetched_at, quote = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    self._entries.move_to_end(symbol)
+                    self.hits += 1
+                    return dict(quote)
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(symbol)
+                    self.stale_hits += 1
+                    self._start_refresh(symbol)
+                    return dict(quote)
+            self.misses += 1
+        return None
+
+    def _fetch_and_store(self, symbol: str) -> Optional[dict]:
+        quote = self.fetch(symbol)
+        if quote is not None:
+            self.put(symbol, quote)
+            return dict(quote)
+        return None
+
+    def _start_refresh(self, symbol: str):
+        # Caller holds the lock
+        if symbol in self._refreshing:
+            return
+        self._refreshing.add(symbol)
+        self.refreshes += 1
+        self._executor.submit(self._refresh, symbol)
+
+    def _refresh(self, symbol: str):
+        try:
+            quote = self.fetch(symbol)
+            if quote is not None:
+                self.put(symbol, quote)
+        finally:
+            with self._lock:
+                self._refreshing.discard(symbol)
+
+
+# Bounded pool used to fetch several quotes at once
+_quote_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("QUOTE_FETCH_WORKERS", "8")), thread_name_prefix="quote"
+)
+
+# Concurrent upstream fetches of one symbol share a single request
+_quote_flights = SingleFlight(timeout=float(os.getenv("QUOTE_FETCH_TIMEOUT", "10")))
+
+# Symbols upstream did not resolve, not asked for again until they expire
+unresolved_symbols = NegativeCache(
+    ttl=float(os.getenv("QUOTE_NEGATIVE_TTL", "60")),
+    maxsize=int(os.getenv("QUOTE_NEGATIVE_CACHE_SIZE", "4096")),
+)
+
+# Stop calling upstream for a while after consecutive failures
+quote_breaker = CircuitBreaker(
+    threshold=int(os.getenv("QUOTE_BREAKER_THRESHOLD", "5")),
+    cooldown=float(os.getenv("QUOTE_BREAKER_COOLDOWN", "30")),
+)
+
+
+def fetch_quote_coalesced(symbol: str) -> Optional[dict]:
+    """Fetch a quote, joining any fetch of the same symbol already in flight."""
+    try:
+        return _quote_flights.do(symbol, fetch_quote, symbol)
     except Exception as e:
-        print("Unexpected lookup error:", e)
+        print("Quote fetch failed for", symbol + ":", e)
         return None
 
 
+# Upstream quote calls one event loop keeps in flight at once
+QUOTE_ASYNC_CONCURRENCY = int(os.getenv("QUOTE_ASYNC_CONCURRENCY", "200"))
+
+
+async def fetch_quote_async(symbol: str) -> Optional[dict]:
+    """Coroutine version of `fetch_quote`."""
+    if symbol in unresolved_symbols or not quote_breaker.allow():
+        return None
+    try:
+        quote = await quote_provider.quote_async(symbol)
+    except Exception as e:
+        return _failed(e)
+    return _resolved(symbol, quote)
+
+
+async def fetch_quote_coalesced_async(symbol: str) -> Optional[dict]:
+    """Coroutine version of `fetch_quote_coalesced`, sharing in-flight fetches with sync callers."""
+    try:
+        return await _quote_flights.do_async(symbol, fetch_quote_async, symbol)
+    except Exception as e:
+        print("Quote fetch failed for", symbol + ":", e)
+        return None
+
+
+async def fetch_quotes_async(symbols: Iterable[str]) -> dict:
+    """Fetch fresh quotes for many normalized symbols concurrently on the running event loop."""
+    symbols = list(dict.fromkeys(symbols))
+    # Semaphores belong to a loop, so each call gets its own
+    limit = asyncio.Semaphore(QUOTE_ASYNC_CONCURRENCY)
+
+    async def fetch(symbol):
+        async with limit:
+            return await fetch_quote_coalesced_async(symbol)
+
+    quotes = await asyncio.gather(*(fetch(symbol) for symbol in symbols))
+    return {symbol: quote for symbol, quote in zip(symbols, quotes) if quote is not None}
+
+
+quote_cache = QuoteCache(
+    fetch_quote_coalesced,
+    ttl=float(os.getenv("QUOTE_CACHE_TTL", "60")),
+    stale_ttl=float(os.getenv("QUOTE_CACHE_STALE_TTL", "300")),
+    maxsize=int(os.getenv("QUOTE_CACHE_SIZE", "1024")),
+    fetch_many_async=fetch_quotes_async,
+    executor=_quote_pool,
+)
+
+
+@timed("quote")
+def lookup(symbol: str) -> Optional[dict]:
+    """Look up quote for symbol, served from the process-wide quote cache."""
+    symbol = normalize_symbol(symbol)
+    if not known_symbol(symbol):
+        return None
+    return quote_cache.get(symbol)
+
+
+@timed("quote")
+def lookup_quotes(symbols: Iterable[str]) -> dict:
+    """Look up quotes for many symbols at once, keyed by normalized symbol."""
+    symbols = [normalize_symbol(symbol) for symbol in symbols]
+    return quote_cache.get_many(symbol for symbol in symbols if valid_symbol(symbol))
+
+
+async def lookup_quotes_async(symbols: Iterable[str]) -> dict:
+    """Coroutine version of `lookup_quotes` for async views."""
+    symbols = [normalize_symbol(symbol) for symbol in symbols]
+    with timed("quote"):
+        return await quote_cache.get_many_async(symbol for symbol in symbols if valid_symbol(symbol))
+
+
+def fetch_quotes(symbols: Iterable[str]) -> dict:
+    """Fetch fresh quotes for many normalized symbols concurrently."""
+    symbols = list(dict.fromkeys(symbols))
+    if len(symbols) == 1:
+        # Refreshes already run on the pool, waiting on it from inside could exhaust it
+        quotes = [fetch_quote_coalesced(symbols[0])]
+    else:
+        quotes = _quote_pool.map(fetch_quote_coalesced, symbols)
+    return {symbol: quote for symbol, quote in zip(symbols, quotes) if quote is not None}
+
+
+@timed("quote")
+def lookup_company_names(symbols: Iterable[str]) -> dict:
+    """Fetch company names for many normalized symbols concurrently, "" for symbols without one."""
+    symbols = list(dict.fromkeys(symbols))
+    names = _quote_pool.map(fetch_company_name, symbols)
+    return {symbol: name for symbol, name in zip(symbols, names) if name is not None}
+
+
+class PortfolioValuation:
+    """
+    A user's positions priced once, with numeric prices and totals.
+
+    Rows carry raw numbers; USD formatting is left to the template's `usd`
+    filter so the same object supplies both the table and the grand total.
+    A position without a quote is unpriced: its price, total and unrealized
+    P&L are None, and so are the totals it would have been part of.
+    """
+
+    def __init__(self, positions: Iterable[dict], quotes: dict, names: dict, cash, realized_pnl=None):
+        self.cash = cash if cash is not None else Decimal("0")
+        self.rows = []
+        for position in positions:
+            if not position["symbol"]:
+                continue
+            quote = quotes.get(position["symbol"])
+            total = position["share_count"] * quote["price"] if quote else None
+            self.rows.append({
+                "symbol": position["symbol"],
+                "name": names.get(position["symbol"], "Not Found"),
+                "share_count": position["share_count"],
+                "price": quote["price"] if quote else None,
+                "total": total,
+                "average_cost": position["cost_basis"] / position["share_count"],
+                "unrealized_pnl": Decimal(str(total)) - position["cost_basis"] if quote else None,
+                "realized_pnl": position["realized_pnl"],
+            })
+        self.unpriced = [row["symbol"] for row in self.rows if row["price"] is None]
+        if self.unpriced:
+            self.holdings_total = self.unrealized_pnl = None
+        else:
+            self.holdings_total = sum((Decimal(str(row["total"])) for row in self.rows), Decimal("0"))
+            self.unrealized_pnl = sum((row["unrealized_pnl"] for row in self.rows), Decimal("0"))
+        # Closed positions have no row but keep their realized P&L, so callers pass the user's total
+        if realized_pnl is None:
+            realized_pnl = sum((row["realized_pnl"] for row in self.rows), Decimal("0"))
+        self.realized_pnl = realized_pnl
+        self.total = self.cash + self.holdings_total if self.holdings_total is not None else None
+
+    def as_dict(self) -> dict:
+        """Plain numbers for JSON, rounded to cents apart from share prices."""
+        def money(value):
+            return round(float(value), 2) if value is not None else None
+
+        return {
+            "cash": money(self.cash),
+            "holdings_total": money(self.holdings_total),
+            "unrealized_pnl": money(self.unrealized_pnl),
+            "realized_pnl": money(self.realized_pnl),
+            "total": money(self.total),
+            "unpriced": self.unpriced,
+            "positions": [
+                {
+                    "symbol": row["symbol"],
+                    "name": row["name"],
+                    "share_count": row["share_count"],
+                    "price": row["price"],
+                    "total": money(row["total"]),
+                    "average_cost": money(row["average_cost"]),
+                    "unrealized_pnl": money(row["unrealized_pnl"]),
+                    "realized_pnl": money(row["realized_pnl"]),
+                }
+                for row in self.rows
+            ],
+        }
+
+
 def usd(value):
-    """Format value as USD."""
+    """Format value as USD, n/a when there is no value."""
+    if value is None:
+        return "n/a"
     return f"${value:,.2f}"
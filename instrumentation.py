@@ -0,0 +1,172 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+request_logger = logging.getLogger("finance.requests")
+
+# Hot path phases reported per request
+PHASES = ("db", "quote", "render")
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Prometheus style cumulative histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+                prefix = label_text + "," if label_text else ""
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{label_text}}} {series['count']}")
+        return lines
+
+
+request_seconds = Histogram(
+    "finance_request_seconds", "Request duration in seconds.", ("endpoint",), SECONDS_BUCKETS
+)
+phase_seconds = Histogram(
+    "finance_request_phase_seconds", "Time per request spent in SQL, quote lookups and rendering.",
+    ("endpoint", "phase"), SECONDS_BUCKETS
+)
+request_queries = Histogram(
+    "finance_request_queries", "SQL statements executed per request.", ("endpoint",), QUERY_BUCKETS
+)
+
+# Callables returning {metric name: value} rendered as gauges on /metrics
+_gauge_sources = []
+
+
+def register_gauges(source):
+    """Add a callable whose {name: value} result is exported as gauges."""
+    _gauge_sources.append(source)
+
+
+def _record(phase: str, seconds: float):
+    timings = g.get("timings") if has_app_context() else None
+    if timings is not None:
+        timings[phase] += seconds
+
+
+@contextmanager
+def timed(phase: str):
+    """Add the time spent in the block, or decorated function, to the request's `phase`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(phase, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    _record("db", time.perf_counter() - started)
+    if has_app_context() and "query_count" in g:
+        g.query_count += 1
+
+
+def _before_render(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    started = g.pop("render_started", None)
+    if started is not None:
+        _record("render", time.perf_counter() - started)
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.timings = dict.fromkeys(PHASES, 0.0)
+    g.query_count = 0
+
+
+def _finish_request(response):
+    if "request_started" not in g:
+        return response
+    duration = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or "unknown"
+
+    response.headers["Server-Timing"] = ", ".join(
+        [f"{phase};dur={g.timings[phase] * 1000:.1f}" for phase in PHASES]
+        + [f'queries;desc="{g.query_count} queries"', f"total;dur={duration * 1000:.1f}"]
+    )
+
+    request_seconds.observe((endpoint,), duration)
+    request_queries.observe((endpoint,), g.query_count)
+    for phase in PHASES:
+        phase_seconds.observe((endpoint, phase), g.timings[phase])
+
+    request_logger.info(json.dumps({
+        "method": request.method,
+        "path": request.path,
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 1),
+        "queries": g.query_count,
+        **{phase + "_ms": round(g.timings[phase] * 1000, 1) for phase in PHASES},
+    }))
+    return response
+
+
+def metrics():
+    """Prometheus text exposition of the request histograms and gauges."""
+    lines = []
+    for histogram in (request_seconds, phase_seconds, request_queries):
+        lines.extend(histogram.render())
+    for source in _gauge_sources:
+        for name, value in source().items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def init_instrumentation(app, log_requests=True, metrics_enabled=False):
+    """Time every request and report it as Server-Timing, a log line and optionally /metrics."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    if log_requests and not request_logger.handlers:
+        request_logger.addHandler(logging.StreamHandler())
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+    if metrics_enabled:
+        app.add_url_rule("/metrics", "metrics", metrics)
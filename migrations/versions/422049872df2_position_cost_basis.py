@@ -0,0 +1,29 @@
+"""position cost basis
+
+Revision ID: 422049872df2
+Revises: 3c7d0449a871
+Create Date: 2026-10-18 12:41:52.660318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '422049872df2'
+down_revision = '3c7d0449a871'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing positions start at zero, run `flask portfolio backfill-pnl` to rebuild them
+    with op.batch_alter_table('portfolio', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cost_basis', sa.Numeric(precision=15, scale=2), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('realized_pnl', sa.Numeric(precision=15, scale=2), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('portfolio', schema=None) as batch_op:
+        batch_op.drop_column('realized_pnl')
+        batch_op.drop_column('cost_basis')
@@ -28,6 +28,8 @@ class PortfolioPosition(db.Model):
     symbol = db.Column(db.String(16), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     share_count = db.Column(db.Integer, nullable=False, default=0)
+    cost_basis = db.Column(db.Numeric(15, 2), nullable=False, default=Decimal("0"))
+    realized_pnl = db.Column(db.Numeric(15, 2), nullable=False, default=Decimal("0"))
 
     user = db.relationship("User", back_populates="portfolio_positions")
 
@@ -48,3 +50,46 @@ class TradeHistory(db.Model):
     timestamp = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
 
     user = db.relationship("User", back_populates="trades")
+
+    __table_args__ = (
+        db.Index("ix_history_user_id_timestamp_id", "user_id", "timestamp", "id"),
+    )
+
+
+class SymbolMetadata(db.Model):
+    __tablename__ = "symbols"
+
+    symbol = db.Column(db.String(16), primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class StoredQuote(db.Model):
+    __tablename__ = "quotes"
+
+    symbol = db.Column(db.String(16), primary_key=True)
+    price = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class Order(db.Model):
+    __tablename__ = "orders"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    symbol = db.Column(db.String(16), nullable=False)
+    share_count = db.Column(db.Integer, nullable=False)
+    trade_type = db.Column(db.String(8), nullable=False)
+    # pending until claimed, settling while a worker prices it, then filled or rejected
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    price = db.Column(db.Numeric(15, 2))
+    message = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    # When a worker marked it settling, stale claims of crashed workers are taken over
+    claimed_at = db.Column(db.DateTime)
+    settled_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_orders_status_id", "status", "id"),
+        db.Index("ix_orders_user_id_id", "user_id", "id"),
+    )
@@ -0,0 +1,226 @@
+import fcntl
+import os
+import threading
+import time
+from datetime import date
+from typing import Iterable, Optional
+
+# Avoid macOS Accelerate longdouble issues triggered when numpy initializes.
+os.environ.setdefault("NPY_DISABLE_LONGDOUBLE", "1")
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+
+# One fixed size record per trading day, so files can be appended to and memory-mapped
+OHLCV = np.dtype([
+    ("date", "datetime64[D]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+])
+
+
+def download_daily_bars(symbols: list, start: date) -> dict:
+    """Download daily OHLCV bars for many symbols in one yfinance call."""
+    try:
+        data = yf.download(
+            symbols, start=start.isoformat(), interval="1d", auto_adjust=False,
+            progress=False, multi_level_index=True
+        )
+    except Exception as e:
+        print("Unexpected price history error:", e)
+        return {}
+    if data is None or data.empty:
+        return {}
+
+    bars = {}
+    for symbol in symbols:
+        if symbol not in data["Close"]:
+            continue
+        frame = pd.DataFrame({
+            field: data[field.capitalize()][symbol] for field in OHLCV.names[1:]
+        }).dropna(subset=["close"])
+        records = np.empty(len(frame), dtype=OHLCV)
+        records["date"] = frame.index.values.astype("datetime64[D]")
+        for field in OHLCV.names[1:]:
+            records[field] = frame[field].fillna(0).values
+        bars[symbol] = records
+    return bars
+
+
+class PriceStore:
+    """
+    Local daily OHLCV history, one append-only binary file per symbol.
+
+    A symbol is bulk loaded from `start` the first time it is synced and
+    afterwards only the missing tail of completed trading days is fetched
+    and appended. Reads memory-map the file, so a date range is a zero-copy
+    slice of the records on disk. A symbol whose download failed is served
+    from disk as it is for `retry_after` seconds before it is tried again.
+    """
+
+    def __init__(self, directory: str, start: date, retry_after: float = 900):
+        self.directory = directory
+        self.start = start
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        # Symbols whose last download failed, with when they may be tried again
+        self._retry_at = {}
+
+    def history(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        """Return the records of `symbol` with start <= date <= end, without copying."""
+        path = self._path(symbol)
+        try:
+            count = os.path.getsize(path) // OHLCV.itemsize
+        except OSError:
+            count = 0
+        if count == 0:
+            return np.empty(0, dtype=OHLCV)
+
+        records = np.memmap(path, dtype=OHLCV, mode="r", shape=(count,))
+        low = 0 if start is None else np.searchsorted(records["date"], np.datetime64(start, "D"), "left")
+        high = count if end is None else np.searchsorted(records["date"], np.datetime64(end, "D"), "right")
+        return records[low:high]
+
+    def stale(self, symbols: Iterable[str]) -> list:
+        """Symbols that have not been synced today."""
+        today = date.today()
+        stale = []
+        for symbol in symbols:
+            try:
+                synced = date.fromtimestamp(os.path.getmtime(self._path(symbol)))
+            except OSError:
+                synced = None
+            if synced != today:
+                stale.append(symbol)
+        return stale
+
+    def due(self, symbols: Iterable[str]) -> list:
+        """Symbols not waiting out a recently failed download."""
+        now = time.monotonic()
+        with self._lock:
+            return [symbol for symbol in symbols if self._retry_at.get(symbol, 0) <= now]
+
+    def sync(self, symbols: Iterable[str]) -> dict:
+        """Append missing completed days for `symbols`, returns rows added per symbol."""
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        os.makedirs(self.directory, exist_ok=True)
+
+        # One download per first missing day, so a new symbol doesn't refetch the others' history
+        starts = {}
+        for symbol in symbols:
+            starts.setdefault(self._next_day(symbol), []).append(symbol)
+        bars = {}
+        for start, group in starts.items():
+            bars.update(download_daily_bars(group, start))
+        retry_at = time.monotonic() + self.retry_after
+        with self._lock:
+            for symbol in symbols:
+                if symbol in bars:
+                    self._retry_at.pop(symbol, None)
+                else:
+                    self._retry_at[symbol] = retry_at
+
+        # Serialize appends between threads and between processes, never around the download
+        with self._lock, open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            today = np.datetime64(date.today(), "D")
+            added = {}
+            for symbol in symbols:
+                # A failed download leaves the symbol stale so a later sync retries it
+                if symbol not in bars:
+                    added[symbol] = 0
+                    continue
+                # Another worker may have appended while this one was downloading
+                tail = np.datetime64(self._next_day(symbol), "D")
+                records = bars[symbol]
+                # Only completed days, today's bar still changes
+                records = records[(records["date"] >= tail) & (records["date"] < today)]
+                with open(self._path(symbol), "ab") as file:
+                    file.write(records.tobytes())
+                # Mark as synced today even when there was nothing new
+                os.utime(self._path(symbol))
+                added[symbol] = len(records)
+        return added
+
+    def closes(self, symbols: Iterable[str], start: date) -> pd.DataFrame:
+        """Return a date x symbol frame of closes from `start`, syncing stale symbols that are due first."""
+        symbols = list(dict.fromkeys(symbols))
+        self.sync(self.due(self.stale(symbols)))
+        series = {}
+        for symbol in symbols:
+            records = self.history(symbol, start)
+            series[symbol] = pd.Series(records["close"], index=pd.DatetimeIndex(records["date"]))
+        return pd.DataFrame(series, columns=symbols).sort_index()
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.directory, symbol + ".ohlcv")
+
+    def _next_day(self, symbol: str) -> date:
+        records = self.history(symbol)
+        if len(records) == 0:
+            return self.start
+        return (records["date"][-1] + np.timedelta64(1, "D")).astype(date)
+
+
+def trades_frame(rows: Iterable) -> pd.DataFrame:
+    """
+    Build the replay input from (timestamp, symbol, trade_type, share_count,
+    stock_price) history rows.
+    """
+    trades = pd.DataFrame(
+        list(rows), columns=["timestamp", "symbol", "trade_type", "share_count", "stock_price"]
+    )
+    # Buys add shares and spend cash, sells the reverse
+    sign = np.where(trades["trade_type"] == "buy", 1, -1)
+    trades["date"] = pd.to_datetime(trades["timestamp"]).dt.normalize()
+    trades["shares"] = sign * trades["share_count"]
+    trades["amount"] = -sign * trades["share_count"] * trades["stock_price"].astype("float64")
+    return trades
+
+
+def portfolio_value_series(trades: pd.DataFrame, closes: pd.DataFrame, final_cash: float) -> pd.Series:
+    """
+    Replay trades against daily closes into a daily portfolio value.
+
+    `trades` has `date`, `symbol`, `shares` (signed) and `amount` (signed
+    cash change) columns. Trades are dropped onto a date x symbol grid and
+    cumulatively summed into positions, so the work is a handful of array
+    operations rather than a loop over days and trades.
+    """
+    if closes.empty:
+        return pd.Series(dtype="float64")
+
+    dates = closes.index.values.astype("datetime64[D]")
+    symbols = list(closes.columns)
+    # Trades on non-trading days count from the next trading day
+    rows = np.searchsorted(dates, trades["date"].values.astype("datetime64[D]"), side="left")
+    rows = np.minimum(rows, len(dates) - 1)
+    columns = pd.Index(symbols).get_indexer(trades["symbol"])
+
+    deltas = np.zeros((len(dates), len(symbols)))
+    known = columns >= 0
+    np.add.at(deltas, (rows[known], columns[known]), trades["shares"].values[known])
+    positions = np.cumsum(deltas, axis=0)
+
+    cash_deltas = np.zeros(len(dates))
+    np.add.at(cash_deltas, rows, trades["amount"].values.astype("float64"))
+    cash = final_cash - cash_deltas.sum() + np.cumsum(cash_deltas)
+
+    prices = np.nan_to_num(closes.ffill().values)
+    return pd.Series(cash + (positions * prices).sum(axis=1), index=closes.index)
+
+
+def chart_points(values: np.ndarray, width: int = 800, height: int = 300) -> str:
+    """Scale values to SVG polyline points."""
+    low, high = values.min(), values.max()
+    spread = (high - low) or 1
+    xs = np.linspace(0, width, len(values))
+    ys = height - (values - low) / spread * height
+    return " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs, ys))
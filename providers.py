@@ -0,0 +1,166 @@
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from typing import Optional
+
+import yfinance as yf
+from yfinance.exceptions import YFException, YFRateLimitError
+
+# Upstream could not be reached or refused us; requests and curl_cffi errors are OSErrors
+TRANSPORT_ERRORS = (OSError, YFRateLimitError)
+
+
+class QuoteProvider:
+    """
+    Source of last prices and company names for normalized symbols.
+
+    A symbol upstream doesn't know is answered with None. Only failures to
+    reach upstream are raised, as one of TRANSPORT_ERRORS.
+    """
+
+    def quote(self, symbol: str) -> Optional[dict]:
+        """Return {"price", "symbol"} for `symbol`, or None when it is unknown."""
+        raise NotImplementedError
+
+    def company_name(self, symbol: str) -> Optional[str]:
+        """Return the company name for `symbol`, or None when it is unknown."""
+        raise NotImplementedError
+
+    async def quote_async(self, symbol: str) -> Optional[dict]:
+        """Coroutine version of `quote`, runs the blocking call on the loop's default executor."""
+        return await asyncio.to_thread(self.quote, symbol)
+
+
+class YFinanceProvider(QuoteProvider):
+    """Live quotes from Yahoo Finance."""
+
+    def quote(self, symbol):
+        # fast_info only so a quote costs a single lightweight call
+        try:
+            price = yf.Ticker(symbol).fast_info["last_price"]
+        except YFRateLimitError:
+            raise
+        except (KeyError, IndexError, YFException):
+            # Unknown symbols have empty history metadata, fast_info then misses currentTradingPeriod
+            return None
+        # No price means Yahoo doesn't know the symbol
+        if not price or math.isnan(price):
+            return None
+        return {
+            "price": float(price),
+            "symbol": symbol
+        }
+
+    def company_name(self, symbol):
+        # info is the slow endpoint, callers keep names for a long time
+        try:
+            return yf.Ticker(symbol).info.get("shortName")
+        except YFRateLimitError:
+            raise
+        except (KeyError, IndexError, YFException):
+            return None
+
+
+class SyntheticProvider(QuoteProvider):
+    """
+    Deterministic offline quotes for load tests and benchmarks.
+
+    Every symbol resolves to a price derived from the symbol itself. Each
+    call sleeps `latency` seconds plus up to `jitter` seconds either way,
+    drawn from a generator seeded with `seed` so runs are repeatable.
+    """
+
+    def __init__(self, latency: float = 0, jitter: float = 0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def quote(self, symbol):
+        self._wait()
+        return {"price": self.price(symbol), "symbol": symbol}
+
+    async def quote_async(self, symbol):
+        # Waits on the event loop instead of holding a thread
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return {"price": self.price(symbol), "symbol": symbol}
+
+    def company_name(self, symbol):
+        self._wait()
+        return symbol + " Inc"
+
+    @staticmethod
+    def price(symbol: str) -> float:
+        """The fixed price of `symbol`, between $5 and $1000."""
+        return round(5 + zlib.crc32(symbol.encode()) % 99500 / 100, 2)
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + self._random.uniform(-self.jitter, self.jitter)
+
+    def _wait(self):
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ReplayProvider(QuoteProvider):
+    """
+    Quotes replayed from a recorded NDJSON file.
+
+    Each line holds a "symbol" and "price" and optionally a "name". The
+    recorded prices of a symbol are returned in file order, wrapping
+    around at the end; symbols not in the file are unknown.
+    """
+
+    def __init__(self, path: str):
+        self.prices = {}
+        self.names = {}
+        with open(path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                symbol = record["symbol"].strip().upper()
+                self.prices.setdefault(symbol, []).append(float(record["price"]))
+                if record.get("name"):
+                    self.names[symbol] = record["name"]
+        self._positions = dict.fromkeys(self.prices, 0)
+        self._lock = threading.Lock()
+
+    def quote(self, symbol):
+        if symbol not in self.prices:
+            return None
+        with self._lock:
+            position = self._positions[symbol]
+            self._positions[symbol] = (position + 1) % len(self.prices[symbol])
+        return {"price": self.prices[symbol][position], "symbol": symbol}
+
+    async def quote_async(self, symbol):
+        # Nothing to wait for, skip the executor round trip
+        return self.quote(symbol)
+
+    def company_name(self, symbol):
+        return self.names.get(symbol)
+
+
+def create_quote_provider(config) -> QuoteProvider:
+    """Build the provider named by QUOTE_PROVIDER from a settings mapping."""
+    name = config.get("QUOTE_PROVIDER", "yfinance")
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "synthetic":
+        return SyntheticProvider(
+            latency=float(config.get("QUOTE_SYNTHETIC_LATENCY", "0")),
+            jitter=float(config.get("QUOTE_SYNTHETIC_JITTER", "0")),
+            seed=int(config.get("QUOTE_SYNTHETIC_SEED", "0")),
+        )
+    if name == "replay":
+        return ReplayProvider(config["QUOTE_REPLAY_FILE"])
+    raise ValueError(f"Unknown quote provider: {name}")
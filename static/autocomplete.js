@@ -0,0 +1,30 @@
+// Suggest listed symbols and company names for inputs marked with data-autocomplete
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("input[data-autocomplete]").forEach(function (input) {
+        var list = document.createElement("datalist");
+        var pending;
+        list.id = input.name + "-suggestions";
+        input.setAttribute("list", list.id);
+        input.after(list);
+
+        input.addEventListener("input", function () {
+            clearTimeout(pending);
+            if (!input.value.trim()) {
+                return;
+            }
+            // Wait for a pause in typing before asking
+            pending = setTimeout(function () {
+                fetch("/api/v1/symbols?q=" + encodeURIComponent(input.value))
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        list.replaceChildren.apply(list, (data.symbols || []).map(function (match) {
+                            var option = document.createElement("option");
+                            option.value = match.symbol;
+                            option.textContent = match.name;
+                            return option;
+                        }));
+                    });
+            }, 150);
+        });
+    });
+});
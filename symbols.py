@@ -0,0 +1,86 @@
+import csv
+import io
+from bisect import bisect_left
+from typing import Iterable
+
+import requests
+
+# Exchange listings published by Nasdaq, pipe separated with a header row
+LISTING_URLS = (
+    "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt",
+    "https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt",
+)
+
+
+class SymbolIndex:
+    """
+    Listed symbols and company names held in sorted arrays.
+
+    Membership is a dict lookup and prefix searches are a bisect into the
+    sorted symbols, or the sorted lower-cased names, followed by a scan of
+    at most `limit` matches, so both take microseconds.
+    """
+
+    def __init__(self, rows: Iterable[tuple]):
+        self.names = {}
+        for symbol, name in rows:
+            self.names[symbol] = name
+        self.symbols = sorted(self.names)
+        self._name_keys = sorted((name.casefold(), symbol) for symbol, name in self.names.items())
+
+    @classmethod
+    def load(cls, path: str) -> "SymbolIndex":
+        """Read a symbol,name CSV file."""
+        with open(path, newline="") as file:
+            return cls((row["symbol"], row["name"]) for row in csv.DictReader(file))
+
+    def save(self, path: str):
+        """Write the index as a symbol,name CSV file."""
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file, lineterminator="\n")
+            writer.writerow(["symbol", "name"])
+            writer.writerows((symbol, self.names[symbol]) for symbol in self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.names
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Return up to `limit` (symbol, name) pairs, symbol prefix matches before name prefix matches."""
+        matches = {}
+        prefix = query.strip().upper()
+        if prefix:
+            index = bisect_left(self.symbols, prefix)
+            while index < len(self.symbols) and len(matches) < limit and self.symbols[index].startswith(prefix):
+                matches[self.symbols[index]] = self.names[self.symbols[index]]
+                index += 1
+
+        prefix = query.strip().casefold()
+        if prefix:
+            index = bisect_left(self._name_keys, (prefix, ""))
+            while index < len(self._name_keys) and len(matches) < limit:
+                name, symbol = self._name_keys[index]
+                if not name.startswith(prefix):
+                    break
+                matches.setdefault(symbol, self.names[symbol])
+                index += 1
+        return list(matches.items())
+
+
+def download_listings() -> list:
+    """Fetch (symbol, name) pairs of every US exchange listing, in Yahoo symbol notation."""
+    rows = []
+    for url in LISTING_URLS:
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        # The last line is a "File Creation Time" footer
+        lines = response.text.strip().splitlines()[:-1]
+        for record in csv.DictReader(io.StringIO("\n".join(lines)), delimiter="|"):
+            symbol = record.get("Symbol") or record.get("ACT Symbol") or ""
+            if record.get("Test Issue") == "Y" or not symbol or "$" in symbol:
+                continue
+            # Class shares are BRK.B on the exchange and BRK-B on Yahoo
+            rows.append((symbol.replace(".", "-"), record["Security Name"]))
+    return rows
@@ -0,0 +1,47 @@
+import os
+import re
+import tempfile
+
+# The application reads its settings at import time
+_directory = tempfile.mkdtemp(prefix="finance-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_directory, "test.db")
+os.environ["QUOTE_PROVIDER"] = "synthetic"
+os.environ["QUOTE_SYNTHETIC_LATENCY"] = "0"
+os.environ["QUOTE_SYNTHETIC_JITTER"] = "0"
+os.environ["SESSION_SECRET"] = "test"
+os.environ["SESSION_BACKEND"] = "cookie"
+os.environ["REQUEST_LOG"] = "0"
+os.environ["PRICE_STORE_DIR"] = os.path.join(_directory, "prices")
+
+import pytest
+
+
+@pytest.fixture
+def app():
+    from application import app
+    from helpers import quote_breaker, quote_cache, unresolved_symbols
+    from models import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    quote_cache.clear()
+    unresolved_symbols.clear()
+    quote_breaker.record_success()
+    yield app
+    with app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as a fresh user with the default $10,000."""
+    client = app.test_client()
+    client.post("/register", data={"username": "test", "password": "test", "confirmation": "test"})
+    client.post("/login", data={"username": "test", "password": "test"})
+    return client
+
+
+def query_count(response) -> int:
+    """SQL statements the request ran, as reported in its Server-Timing header."""
+    return int(re.search(r'(\d+) queries', response.headers["Server-Timing"]).group(1))
@@ -0,0 +1,50 @@
+from helpers import CircuitBreaker, quote_breaker, quote_cache
+
+
+def trip(breaker):
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker(threshold=2, cooldown=0)
+    trip(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_refused_quotes_are_503_while_open_or_half_open(app, client, monkeypatch):
+    trip(quote_breaker)
+    assert client.post("/quote", data={"symbol": "AAPL"}).status_code == 503
+
+    # After the cooldown another request holds the half-open probe
+    monkeypatch.setattr(quote_breaker, "cooldown", 0)
+    assert quote_breaker.allow()
+    assert quote_breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.post("/quote", data={"symbol": "AAPL"}).status_code == 503
+    assert client.post("/buy", data={"symbol": "AAPL", "shares": "1"}).status_code == 503
+
+    quote_breaker.record_success()
+    assert client.post("/quote", data={"symbol": "AAPL"}).status_code == 200
+
+
+def test_refused_quotes_are_503_for_sells_and_the_api(app, client):
+    assert client.post("/buy", data={"symbol": "AAPL", "shares": "2"}).status_code == 302
+    quote_cache.clear()
+    trip(quote_breaker)
+
+    assert client.post("/sell", data={"symbol": "1", "shares": "1"}).status_code == 503
+    assert client.get("/api/v1/quotes?symbols=AAPL").status_code == 503
+    orders = [{"symbol": "AAPL", "shares": 1, "type": "sell"}]
+    assert client.post("/api/v1/trades", json={"orders": orders}).status_code == 503
+    # Unlisted symbols are still unknown, the breaker has nothing to do with them
+    orders = [{"symbol": "APPL", "shares": 1, "type": "buy"}]
+    assert client.post("/api/v1/trades", json={"orders": orders}).status_code == 400
+    assert client.get("/api/v1/quotes?symbols=APPL").get_json()["unknown"] == ["APPL"]
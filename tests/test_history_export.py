@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+
+# Millions of rows by default; set EXPORT_TEST_ROWS lower for a quick run
+ROWS = int(os.getenv("EXPORT_TEST_ROWS", "1000000"))
+# Growth of resident memory allowed while streaming the whole export
+MEMORY_BUDGET = 16 * 1024 * 1024
+
+
+def seed_history(app, user_id, rows):
+    """Insert `rows` trades for one user inside SQLite, without building them in Python."""
+    from models import db
+
+    with app.app_context():
+        db.session.execute(text(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :rows) "
+            "INSERT INTO history (symbol, user_id, stock_price, share_count, trade_type, timestamp) "
+            "SELECT 'AAPL', :user_id, 10 + i % 100, 1 + i % 10, "
+            "CASE i % 2 WHEN 0 THEN 'buy' ELSE 'sell' END, "
+            "datetime('2020-01-01', '+' || i || ' seconds') FROM n"
+        ), {"rows": rows, "user_id": user_id})
+        db.session.commit()
+
+
+def resident_bytes() -> int:
+    """Current resident set size of this process."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def stream_export(client, export_format):
+    """Download the export chunk by chunk, returning (rows, first line, last line, peak growth in bytes)."""
+    rows = 0
+    first = last = b""
+    pending = b""
+    baseline = peak = resident_bytes()
+    response = client.get(f"/history/export?format={export_format}", buffered=False)
+    assert response.status_code == 200
+    for chunk in response.response:
+        chunk = chunk.encode() if isinstance(chunk, str) else chunk
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if lines:
+            first = first or lines[0]
+            last = lines[-1]
+            rows += len(lines)
+        peak = max(peak, resident_bytes())
+    response.close()
+    assert pending == b""
+    return rows, first, last, peak - baseline
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="reads resident memory from /proc")
+@pytest.mark.parametrize("export_format", ["csv", "ndjson"])
+def test_export_streams_millions_of_rows_within_memory_budget(app, client, export_format):
+    seed_history(app, 1, ROWS)
+
+    rows, first, last, peak = stream_export(client, export_format)
+
+    if export_format == "csv":
+        assert first == b"timestamp,trade_type,symbol,share_count,stock_price\r"
+        assert rows == ROWS + 1
+        last = dict(zip(["timestamp", "trade_type", "symbol", "share_count", "stock_price"], last.decode().strip().split(",")))
+    else:
+        assert rows == ROWS
+        assert json.loads(first)["timestamp"] == "2020-01-01 00:00:01"
+        last = json.loads(last)
+    assert str(last["share_count"]) == str(1 + ROWS % 10)
+    assert last["stock_price"] == f"{10 + ROWS % 100}.00"
+    assert peak < MEMORY_BUDGET, f"export peaked at {peak / 1e6:.1f} MB"
@@ -0,0 +1,111 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+import application
+import helpers
+from application import settle_orders
+from models import Order, TradeHistory, User, db
+from providers import SyntheticProvider
+
+
+class FlakyProvider(SyntheticProvider):
+    """Synthetic quotes that fail while `down`, and never resolve ZZZZ."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def quote(self, symbol):
+        if self.down:
+            raise ConnectionError("upstream down")
+        return None if symbol == "ZZZZ" else super().quote(symbol)
+
+
+def queue_orders(*symbols):
+    db.session.add(User(username="trader", hash="x", cash=Decimal("100000")))
+    db.session.add_all(Order(user_id=1, symbol=symbol, share_count=1, trade_type="buy") for symbol in symbols)
+    db.session.commit()
+
+
+def statuses():
+    return dict(db.session.execute(db.select(Order.symbol, Order.status)).all())
+
+
+def test_parallel_settlers_fill_each_order_once(app, monkeypatch):
+    with app.app_context():
+        queue_orders("AAPL", "MSFT", "AMZN", "NVDA", "TSLA")
+
+    # Hold both settlers between reading their batch and pricing it
+    both_read = threading.Barrier(2)
+    lookup_quotes = application.lookup_quotes
+
+    def lookup_quotes_together(symbols):
+        try:
+            both_read.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        return lookup_quotes(symbols)
+
+    monkeypatch.setattr(application, "lookup_quotes", lookup_quotes_together)
+    settled = []
+
+    def settler():
+        with app.app_context():
+            settled.append(settle_orders())
+
+    threads = [threading.Thread(target=settler) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(settled) == [0, 5]
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(TradeHistory)) == 5
+        assert set(statuses().values()) == {"filled"}
+
+
+def test_orders_wait_out_upstream_failures(app, monkeypatch):
+    provider = FlakyProvider()
+    monkeypatch.setattr(helpers, "quote_provider", provider)
+    with app.app_context():
+        queue_orders("AAPL", "ZZZZ")
+
+        provider.down = True
+        assert settle_orders() == 0
+        assert statuses() == {"AAPL": "pending", "ZZZZ": "pending"}
+
+        provider.down = False
+        helpers.quote_breaker.record_success()
+        assert settle_orders() == 2
+        assert statuses() == {"AAPL": "filled", "ZZZZ": "rejected"}
+
+
+def test_orders_of_a_crashed_settler_are_claimed_again(app, monkeypatch):
+    with app.app_context():
+        queue_orders("AAPL", "MSFT")
+        # A worker claims the batch and dies before settling it
+        assert len(application.claim_pending_orders()) == 2
+        assert settle_orders() == 0
+        assert statuses() == {"AAPL": "settling", "MSFT": "settling"}
+
+        monkeypatch.setitem(app.config, "ORDER_CLAIM_TIMEOUT", timedelta(0))
+        assert settle_orders() == 2
+        assert statuses() == {"AAPL": "filled", "MSFT": "filled"}
+
+
+def test_failed_settlement_puts_orders_back_in_the_queue(app, monkeypatch):
+    def broken_trade(user_id, order):
+        raise RuntimeError("database went away")
+
+    with app.app_context():
+        queue_orders("AAPL", "MSFT")
+        monkeypatch.setattr(application, "apply_trade", broken_trade)
+        assert settle_orders() == 0
+        assert statuses() == {"AAPL": "pending", "MSFT": "pending"}
+        assert db.session.scalar(db.select(db.func.count()).select_from(TradeHistory)) == 0
+
+        monkeypatch.undo()
+        assert settle_orders() == 2
+        assert statuses() == {"AAPL": "filled", "MSFT": "filled"}
@@ -0,0 +1,46 @@
+import helpers
+from application import execute_trade
+from providers import SyntheticProvider
+
+
+def test_realized_pnl_includes_closed_positions(app, client):
+    with app.app_context():
+        assert execute_trade(1, "AAPL", 100, 10, "buy") is None
+        assert execute_trade(1, "AAPL", 150, 10, "sell") is None
+        assert execute_trade(1, "MSFT", 20, 5, "buy") is None
+        assert execute_trade(1, "MSFT", 30, 2, "sell") is None
+
+    portfolio = client.get("/api/v1/portfolio").get_json()
+    assert [position["symbol"] for position in portfolio["positions"]] == ["MSFT"]
+    assert portfolio["positions"][0]["realized_pnl"] == 20.0
+    assert portfolio["realized_pnl"] == 520.0
+
+    assert b"<td>$520.00</td>" in client.get("/").data
+
+
+class AppleOnlyProvider(SyntheticProvider):
+    def quote(self, symbol):
+        return super().quote(symbol) if symbol == "AAPL" else None
+
+    async def quote_async(self, symbol):
+        return self.quote(symbol)
+
+
+def test_positions_without_a_quote_are_unpriced(app, client, monkeypatch):
+    monkeypatch.setattr(helpers, "quote_provider", AppleOnlyProvider())
+    with app.app_context():
+        assert execute_trade(1, "AAPL", 100, 1, "buy") is None
+        assert execute_trade(1, "MSFT", 100, 1, "buy") is None
+
+    portfolio = client.get("/api/v1/portfolio").get_json()
+    positions = {position["symbol"]: position for position in portfolio["positions"]}
+    assert positions["AAPL"]["price"] == SyntheticProvider.price("AAPL")
+    assert positions["MSFT"]["price"] is None
+    assert positions["MSFT"]["total"] is None
+    assert positions["MSFT"]["unrealized_pnl"] is None
+    assert portfolio["unpriced"] == ["MSFT"]
+    assert portfolio["holdings_total"] is None
+    assert portfolio["total"] is None
+    assert portfolio["cash"] == 9800.0
+
+    assert b"n/a" in client.get("/").data
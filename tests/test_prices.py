@@ -0,0 +1,74 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+import prices
+from prices import OHLCV, PriceStore
+
+
+def bars(*days):
+    records = np.zeros(len(days), dtype=OHLCV)
+    records["date"] = np.array(days, dtype="datetime64[D]")
+    records["close"] = 10
+    return records
+
+
+def test_sync_appends_completed_days_and_marks_symbol_synced(tmp_path, monkeypatch):
+    yesterday = date.today() - timedelta(days=1)
+    monkeypatch.setattr(prices, "download_daily_bars", lambda symbols, start: {"AAPL": bars(yesterday, date.today())})
+    store = PriceStore(str(tmp_path), yesterday)
+
+    assert store.sync(["AAPL"]) == {"AAPL": 1}
+    assert list(store.history("AAPL")["date"]) == [np.datetime64(yesterday, "D")]
+    assert store.stale(["AAPL"]) == []
+
+
+def test_failed_download_leaves_symbols_stale(tmp_path, monkeypatch):
+    monkeypatch.setattr(prices, "download_daily_bars", lambda symbols, start: {})
+    store = PriceStore(str(tmp_path), date.today() - timedelta(days=7))
+
+    assert store.sync(["AAPL", "MSFT"]) == {"AAPL": 0, "MSFT": 0}
+    assert not (tmp_path / "AAPL.ohlcv").exists()
+    assert store.stale(["AAPL", "MSFT"]) == ["AAPL", "MSFT"]
+
+
+def test_sync_downloads_each_missing_tail_separately_without_the_lock(tmp_path, monkeypatch):
+    today = date.today()
+    start = today - timedelta(days=10)
+    store = PriceStore(str(tmp_path), start)
+    calls = []
+
+    def download(symbols, since):
+        assert not store._lock.locked()
+        calls.append((sorted(symbols), since))
+        return {symbol: bars(*(since + timedelta(days=n) for n in range((today - since).days))) for symbol in symbols}
+
+    monkeypatch.setattr(prices, "download_daily_bars", download)
+    store.sync(["AAPL"])
+    calls.clear()
+    # Pretend AAPL was synced on an earlier day
+    os.utime(tmp_path / "AAPL.ohlcv", (0, 0))
+
+    assert store.sync(["AAPL", "MSFT"]) == {"AAPL": 0, "MSFT": 10}
+    assert calls == [(["AAPL"], today), (["MSFT"], start)]
+
+
+def test_failed_symbols_wait_before_the_view_retries_them(tmp_path, monkeypatch):
+    calls = []
+
+    def download(symbols, since):
+        calls.append(sorted(symbols))
+        return {}
+
+    monkeypatch.setattr(prices, "download_daily_bars", download)
+    store = PriceStore(str(tmp_path), date.today() - timedelta(days=7), retry_after=60)
+
+    assert store.closes(["AAPL"], date.today()).empty
+    assert store.closes(["AAPL"], date.today()).empty
+    assert calls == [["AAPL"]]
+
+    store.retry_after = 0
+    store.sync(["AAPL"])
+    store.closes(["AAPL"], date.today())
+    assert calls == [["AAPL"], ["AAPL"], ["AAPL"]]
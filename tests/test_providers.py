@@ -0,0 +1,84 @@
+import pytest
+from curl_cffi.requests.exceptions import ConnectionError as CurlConnectionError
+
+import helpers
+import providers
+from helpers import CircuitBreaker, fetch_company_name, fetch_quote, quote_breaker, unresolved_symbols
+from providers import YFinanceProvider
+
+
+class FakeFastInfo:
+    def __init__(self, price, error):
+        self.price = price
+        self.error = error
+
+    def __getitem__(self, key):
+        if self.error:
+            raise self.error
+        return self.price
+
+
+class FakeTicker:
+    """Stands in for yf.Ticker, failing the way yfinance 0.2.66 does."""
+
+    calls = []
+    outage = False
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        FakeTicker.calls.append(symbol)
+
+    def _error(self):
+        if FakeTicker.outage:
+            return CurlConnectionError("Failed to perform, curl: (7) Couldn't connect to server")
+        if self.symbol != "AAPL":
+            # Unknown symbols come back with empty history metadata
+            return KeyError("currentTradingPeriod")
+        return None
+
+    @property
+    def fast_info(self):
+        return FakeFastInfo(123.45, self._error())
+
+    @property
+    def info(self):
+        if self._error():
+            raise self._error()
+        return {"shortName": "Apple Inc."}
+
+
+@pytest.fixture
+def fake_yahoo(app, monkeypatch):
+    FakeTicker.calls = []
+    FakeTicker.outage = False
+    monkeypatch.setattr(providers.yf, "Ticker", FakeTicker)
+    monkeypatch.setattr(helpers, "quote_provider", YFinanceProvider())
+    return FakeTicker
+
+
+def test_unknown_symbols_are_negative_cached_without_opening_the_breaker(fake_yahoo):
+    bad = [f"BAD{n}" for n in range(quote_breaker.threshold * 2)]
+    for symbol in bad:
+        assert fetch_quote(symbol) is None
+    assert quote_breaker.state == CircuitBreaker.CLOSED
+    assert all(symbol in unresolved_symbols for symbol in bad)
+
+    assert fetch_quote("BAD0") is None
+    assert fake_yahoo.calls.count("BAD0") == 1
+    assert fetch_quote("AAPL") == {"price": 123.45, "symbol": "AAPL"}
+    assert fetch_company_name("AAPL") == "Apple Inc."
+    assert fetch_company_name("BAD1") == ""
+    assert quote_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_transport_failures_open_the_breaker(fake_yahoo):
+    fake_yahoo.outage = True
+    for _ in range(quote_breaker.threshold):
+        assert fetch_quote("AAPL") is None
+    assert quote_breaker.state == CircuitBreaker.OPEN
+    assert "AAPL" not in unresolved_symbols
+
+    calls = len(fake_yahoo.calls)
+    assert fetch_quote("MSFT") is None
+    assert fetch_company_name("MSFT") is None
+    assert len(fake_yahoo.calls) == calls
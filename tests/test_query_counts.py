@@ -0,0 +1,31 @@
+import pytest
+
+from conftest import query_count
+
+# Most SQL statements each warm request may run; a higher count is a regression.
+# Loading the user once per request took /buy down from 5 and /sell from 6.
+STATEMENT_BUDGETS = {
+    ("GET", "/"): 4,
+    ("GET", "/history"): 2,
+    # The user loaded once into g
+    ("GET", "/profile"): 1,
+    ("GET", "/api/v1/portfolio"): 4,
+    # The company name, the quote itself comes from the cache
+    ("POST", "/quote"): 1,
+    ("POST", "/buy"): 4,
+    ("POST", "/sell"): 5,
+}
+
+
+@pytest.mark.parametrize("method, path", STATEMENT_BUDGETS)
+def test_route_statement_counts(client, method, path):
+    # Hold a position and warm the name and quote caches first
+    client.post("/buy", data={"symbol": "AAPL", "shares": "5"})
+    client.get("/")
+
+    # The sell form posts the position's row number rather than its symbol
+    data = {"symbol": "1" if path == "/sell" else "AAPL", "shares": "1"} if method == "POST" else None
+    response = client.open(path, method=method, data=data)
+
+    assert response.status_code in (200, 302)
+    assert query_count(response) <= STATEMENT_BUDGETS[method, path]
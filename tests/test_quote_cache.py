@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import helpers
+from helpers import QuoteCache, fetch_quote_coalesced, fetch_quotes_async, lookup, lookup_quotes
+from providers import QuoteProvider
+
+
+class FakeProvider(QuoteProvider):
+    """Local stand-in for yfinance that counts calls."""
+
+    def __init__(self, prices):
+        self.prices = dict(prices)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def quote(self, symbol):
+        with self._lock:
+            self.calls.append(symbol)
+        if symbol not in self.prices:
+            return None
+        return {"price": self.prices[symbol], "symbol": symbol}
+
+    def company_name(self, symbol):
+        return symbol + " Corp" if symbol in self.prices else None
+
+
+class SlowFakeProvider(FakeProvider):
+    """FakeProvider whose calls take `delay` seconds, long enough for callers to overlap."""
+
+    def __init__(self, prices, delay=0.2):
+        super().__init__(prices)
+        self.delay = delay
+
+    def quote(self, symbol):
+        time.sleep(self.delay)
+        return super().quote(symbol)
+
+    async def quote_async(self, symbol):
+        await asyncio.sleep(self.delay)
+        return super().quote(symbol)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_fresh_entries_are_served_from_memory():
+    provider = FakeProvider({"AAPL": 100.0})
+    cache = QuoteCache(provider.quote, ttl=60, stale_ttl=60)
+
+    assert cache.get("AAPL") == {"price": 100.0, "symbol": "AAPL"}
+    assert cache.get("AAPL") == {"price": 100.0, "symbol": "AAPL"}
+    assert provider.calls == ["AAPL"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_lru_eviction_keeps_size_bound():
+    provider = FakeProvider({"A": 1.0, "B": 2.0, "C": 3.0})
+    cache = QuoteCache(provider.quote, maxsize=2)
+
+    cache.get("A")
+    cache.get("B")
+    cache.get("A")  # A is now most recently used
+    cache.get("C")
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    cache.get("A")
+    assert provider.calls == ["A", "B", "C"]
+    cache.get("B")
+    assert provider.calls == ["A", "B", "C", "B"]
+
+
+def test_stale_entries_are_returned_while_refreshing():
+    provider = FakeProvider({"AAPL": 200.0})
+    cache = QuoteCache(provider.quote, ttl=10, stale_ttl=60)
+    cache.put("AAPL", {"price": 100.0, "symbol": "AAPL"}, fetched_at=time.monotonic() - 20)
+
+    # The stale price comes back at once, the refresh happens in the background
+    assert cache.get("AAPL")["price"] == 100.0
+    wait_for(lambda: cache.get("AAPL")["price"] == 200.0)
+    assert provider.calls == ["AAPL"]
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_stale_refreshes_run_on_the_bounded_executor():
+    symbols = [f"S{index:02d}" for index in range(40)]
+    provider = SlowFakeProvider({symbol: 200.0 for symbol in symbols}, delay=0.01)
+    cache = QuoteCache(provider.quote, ttl=10, stale_ttl=60, executor=ThreadPoolExecutor(max_workers=2))
+    for symbol in symbols:
+        cache.put(symbol, {"price": 100.0, "symbol": symbol}, fetched_at=time.monotonic() - 20)
+    threads = threading.active_count()
+
+    assert {quote["price"] for quote in cache.get_many(symbols).values()} == {100.0}
+    assert threading.active_count() <= threads + 2
+    wait_for(lambda: all(quote["price"] == 200.0 for quote in cache.get_many(symbols).values()))
+    assert sorted(provider.calls) == symbols
+
+
+def test_expired_entries_are_fetched_again():
+    provider = FakeProvider({"AAPL": 200.0})
+    cache = QuoteCache(provider.quote, ttl=10, stale_ttl=10)
+    cache.put("AAPL", {"price": 100.0, "symbol": "AAPL"}, fetched_at=time.monotonic() - 30)
+
+    assert cache.get("AAPL")["price"] == 200.0
+    assert provider.calls == ["AAPL"]
+
+
+def test_failed_lookups_are_not_cached():
+    provider = FakeProvider({})
+    cache = QuoteCache(provider.quote)
+
+    assert cache.get("NOPE") is None
+    assert cache.get("NOPE") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lookup_uses_the_configured_provider(app, monkeypatch):
+    provider = FakeProvider({"AAPL": 123.45, "MSFT": 67.89})
+    monkeypatch.setattr(helpers, "quote_provider", provider)
+
+    assert lookup(" aapl ") == {"price": 123.45, "symbol": "AAPL"}
+    assert lookup("AAPL")["price"] == 123.45
+    assert lookup_quotes(["aapl", "msft", "msft"]) == {
+        "AAPL": {"price": 123.45, "symbol": "AAPL"},
+        "MSFT": {"price": 67.89, "symbol": "MSFT"},
+    }
+    assert sorted(provider.calls) == ["AAPL", "MSFT"]
+
+
+def test_async_fetches_share_in_flight_calls(app, monkeypatch):
+    provider = SlowFakeProvider({"AAPL": 100.0, "MSFT": 50.0})
+    monkeypatch.setattr(helpers, "quote_provider", provider)
+    sync_quotes = []
+
+    async def fetch_together():
+        # A sync worker joins the fetch the event loop has in flight
+        loop = asyncio.get_running_loop()
+        fetches = asyncio.gather(fetch_quotes_async(["AAPL", "MSFT"]), fetch_quotes_async(["AAPL"]))
+        await asyncio.sleep(0.05)
+        sync_fetch = loop.run_in_executor(None, fetch_quote_coalesced, "AAPL")
+        sync_quotes.append(await sync_fetch)
+        return await fetches
+
+    both, aapl = asyncio.run(fetch_together())
+
+    assert both == {"AAPL": {"price": 100.0, "symbol": "AAPL"}, "MSFT": {"price": 50.0, "symbol": "MSFT"}}
+    assert aapl == {"AAPL": {"price": 100.0, "symbol": "AAPL"}}
+    assert sync_quotes == [{"price": 100.0, "symbol": "AAPL"}]
+    assert sorted(provider.calls) == ["AAPL", "MSFT"]
@@ -0,0 +1,39 @@
+import helpers
+from application import get_symbol_names
+from providers import SyntheticProvider
+
+
+class NamelessProvider(SyntheticProvider):
+    """Synthetic quotes, but only AAPL has a company name."""
+
+    def __init__(self):
+        super().__init__()
+        self.name_calls = []
+        self.down = False
+
+    def company_name(self, symbol):
+        self.name_calls.append(symbol)
+        if self.down:
+            raise ConnectionError("upstream down")
+        return "Apple Inc." if symbol == "AAPL" else None
+
+
+def test_names_are_fetched_once_and_missing_names_are_remembered(app, monkeypatch):
+    provider = NamelessProvider()
+    monkeypatch.setattr(helpers, "quote_provider", provider)
+
+    with app.app_context():
+        assert get_symbol_names(["AAPL", "XYZ"]) == {"AAPL": "Apple Inc."}
+        assert get_symbol_names(["AAPL", "XYZ"]) == {"AAPL": "Apple Inc."}
+    assert sorted(provider.name_calls) == ["AAPL", "XYZ"]
+
+
+def test_failed_name_lookups_are_not_stored(app, monkeypatch):
+    provider = NamelessProvider()
+    provider.down = True
+    monkeypatch.setattr(helpers, "quote_provider", provider)
+
+    with app.app_context():
+        assert get_symbol_names(["AAPL"]) == {}
+        provider.down = False
+        assert get_symbol_names(["AAPL"]) == {"AAPL": "Apple Inc."}
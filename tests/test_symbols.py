@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+import helpers
+from helpers import lookup
+from models import PortfolioPosition, db
+from providers import SyntheticProvider
+
+
+class CountingProvider(SyntheticProvider):
+    """Synthetic quotes that counts upstream calls and never resolves ZZZZ."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def quote(self, symbol):
+        self.calls.append(symbol)
+        return None if symbol == "ZZZZ" else super().quote(symbol)
+
+
+def test_listed_symbols_are_quoted_and_bought(app, client, monkeypatch):
+    monkeypatch.setattr(helpers, "quote_provider", CountingProvider())
+
+    assert b"GME" in client.post("/quote", data={"symbol": "gme"}).data
+    assert client.post("/buy", data={"symbol": "SOFI", "shares": "1"}).status_code == 302
+    response = client.get("/api/v1/quotes?symbols=RIVN,TSM")
+    assert [quote["symbol"] for quote in response.get_json()["quotes"]] == ["RIVN", "TSM"]
+
+
+def test_unlisted_symbols_are_refused_without_an_upstream_call(app, client, monkeypatch):
+    provider = CountingProvider()
+    monkeypatch.setattr(helpers, "quote_provider", provider)
+
+    assert client.post("/quote", data={"symbol": "APPL"}).status_code == 400
+    assert client.get("/api/v1/quotes?symbols=APPL").get_json()["unknown"] == ["APPL"]
+    response = client.post("/api/v1/trades", json={"orders": [{"symbol": "APPL", "shares": 1, "type": "buy"}]})
+    assert response.status_code == 400
+    assert provider.calls == []
+
+
+def test_held_unlisted_positions_can_still_be_sold(app, client, monkeypatch):
+    monkeypatch.setattr(helpers, "quote_provider", CountingProvider())
+    with app.app_context():
+        db.session.add(PortfolioPosition(user_id=1, symbol="OLDCO", share_count=2, cost_basis=Decimal("20")))
+        db.session.commit()
+
+    response = client.post("/api/v1/trades", json={"orders": [{"symbol": "OLDCO", "shares": 2, "type": "sell"}]})
+    assert response.status_code == 201
+
+
+def test_without_an_index_bad_symbols_are_asked_for_once(app, monkeypatch):
+    provider = CountingProvider()
+    monkeypatch.setattr(helpers, "quote_provider", provider)
+    monkeypatch.setattr(helpers, "symbol_index", None)
+
+    with app.app_context():
+        assert lookup("not a symbol!") is None
+        assert lookup("ZZZZ") is None
+        helpers.quote_cache.clear()
+        assert lookup("ZZZZ") is None
+    assert provider.calls == ["ZZZZ"]
+
+
+def test_index_backs_autocomplete(client):
+    symbols = client.get("/api/v1/symbols?q=app").get_json()["symbols"]
+    assert {"symbol": "AAPL", "name": "Apple Inc."} in symbols
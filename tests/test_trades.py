@@ -0,0 +1,79 @@
+import threading
+from decimal import Decimal
+
+from application import execute_trade
+from models import PortfolioPosition, TradeHistory, User, db
+
+THREADS = 8
+TRADES_PER_THREAD = 25
+
+
+def create_user(cash="100000"):
+    user = User(username="trader", hash="x", cash=Decimal(cash))
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def run_concurrently(app, trade):
+    """Run THREADS x TRADES_PER_THREAD buys of 1 share at $10, returns the errors raised."""
+    errors = []
+
+    def worker():
+        with app.app_context():
+            for index in range(TRADES_PER_THREAD):
+                try:
+                    trade("AAPL" if index % 2 else "MSFT")
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+# Throughput is measured by benchmark.py, wall-clock comparisons are too noisy for a test
+def test_concurrent_buys_lose_no_updates(app):
+    trades = THREADS * TRADES_PER_THREAD
+
+    with app.app_context():
+        user_id = create_user()
+    errors = run_concurrently(app, lambda symbol: execute_trade(user_id, symbol, 10, 1, "buy"))
+
+    with app.app_context():
+        assert errors == []
+        assert db.session.get(User, user_id).cash == Decimal("100000") - 10 * trades
+        assert TradeHistory.query.count() == trades
+        assert sum(position.share_count for position in PortfolioPosition.query) == trades
+
+
+def test_concurrent_sells_never_oversell(app):
+    with app.app_context():
+        user_id = create_user()
+        execute_trade(user_id, "AAPL", 10, 10, "buy")
+
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        with app.app_context():
+            message = execute_trade(user_id, "AAPL", 12, 1, "sell")
+            with lock:
+                results.append(message)
+
+    threads = [threading.Thread(target=worker) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(None) == 10
+    with app.app_context():
+        position = PortfolioPosition.query.filter_by(user_id=user_id, symbol="AAPL").one()
+        assert position.share_count == 0
+        assert db.session.get(User, user_id).cash == Decimal("100000") - 100 + 120
+        assert position.realized_pnl == Decimal("20")